@@ -1,5 +1,7 @@
 import asyncio
 import logging
+import logging.handlers
+import queue
 import sys
 
 from aiogram import Bot, Dispatcher, F
@@ -21,6 +23,7 @@ from handlers.admin import (archive_handlers as admin_archive,
 from handlers.user import (item_addition, list_editing, list_management,
                            list_saving, product_bridge)  # type: ignore
 from middlewares.logging_middleware import LoggingMiddleware  # type: ignore
+from middlewares.render_cache import RenderCacheMiddleware  # type: ignore
 
 # Нове: імпортуємо хендлери карток/додавання з кешем
 from handlers.user.card_handlers import open_product  # type: ignore
@@ -44,6 +47,33 @@ async def set_main_menu(bot: Bot):
     await bot.set_my_commands([])
 
 
+def _start_queue_logging() -> logging.handlers.QueueListener:
+    """
+    Переводить кореневий логер на QueueHandler: запис у stdout/bot.log
+    виконує фоновий потік QueueListener, а не event loop.
+    """
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    for h in handlers:
+        root.removeHandler(h)
+    root.addHandler(logging.handlers.QueueHandler(q))
+    listener.start()
+    return listener
+
+
+def _stop_queue_logging(listener: logging.handlers.QueueListener) -> None:
+    """Дописує чергу та повертає кореневому логеру справжні хендлери."""
+    listener.stop()
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if isinstance(h, logging.handlers.QueueHandler):
+            root.removeHandler(h)
+    for h in listener.handlers:
+        root.addHandler(h)
+
+
 async def main():
     """
     Головна асинхронна функція для ініціалізації та запуску бота.
@@ -62,7 +92,18 @@ async def main():
         ]
     )
     logger = logging.getLogger(__name__)
+    # Логування з middleware/хендлерів не повинно блокувати event loop на I/O
+    log_listener = _start_queue_logging()
+    try:
+        await _run(logger)
+    finally:
+        _stop_queue_logging(log_listener)
+
 
+async def _run(logger: logging.Logger):
+    """
+    Перевірка БД, реєстрація роутерів і запуск поллінгу.
+    """
     if not BOT_TOKEN:
         logger.critical("Критична помилка: BOT_TOKEN не знайдено! Перевірте ваш .env файл.")
         sys.exit(1)
@@ -88,6 +129,8 @@ async def main():
         parse_mode="Markdown",
         link_preview_is_disabled=True
     ))
+    # Скидання кешу відрендерених карток при будь-якому редагуванні повідомлень
+    bot.session.middleware(RenderCacheMiddleware())
     dp = Dispatcher()
 
     # Логування апдейтів
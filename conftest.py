@@ -0,0 +1 @@
+# Порожній conftest у корені: pytest додає корінь репозиторію в sys.path для tests/
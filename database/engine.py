@@ -1,4 +1,6 @@
+import json
 import logging
+from functools import partial
 
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
@@ -9,6 +11,16 @@ from config import DATABASE_URL, SYNC_DATABASE_URL
 # Налаштування логера для цього модуля
 logger = logging.getLogger(__name__)
 
+# Серіалізатор JSON-колонок (кеш карток тощо). Стандартний json.dumps пише
+# кирилицю як \uXXXX (6 байтів на літеру) — пишемо UTF-8 як є, через orjson, якщо встановлено.
+try:
+    import orjson  # type: ignore
+
+    def _json_serializer(obj) -> str:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+except ImportError:  # pragma: no cover
+    _json_serializer = partial(json.dumps, ensure_ascii=False, separators=(",", ":"), default=str)
+
 try:
     # --- Асинхронна частина (для роботи бота) ---
     # Створюємо асинхронний "двигун" для взаємодії з БД.
@@ -17,7 +29,8 @@ try:
         DATABASE_URL,
         echo=False,  # Встановіть True, щоб бачити всі SQL-запити в консолі (для дебагінгу)
         pool_pre_ping=True,  # Перевіряє з'єднання перед використанням, щоб уникнути помилок з'єднання
-        pool_recycle=3600    # Пере-встановлює з'єднання кожну годину для стабільності
+        pool_recycle=3600,   # Пере-встановлює з'єднання кожну годину для стабільності
+        json_serializer=_json_serializer,
     )
     
     # Створюємо фабрику асинхронних сесій.
@@ -36,7 +49,8 @@ try:
         SYNC_DATABASE_URL,
         echo=False,
         pool_pre_ping=True,
-        pool_recycle=3600
+        pool_recycle=3600,
+        json_serializer=_json_serializer,
     )
     
     # Створюємо фабрику синхронних сесій.
@@ -27,6 +27,7 @@ from typing import Any, Iterable, List, Optional
 
 from sqlalchemy import (
     JSON,
+    BigInteger,
     Boolean,
     CheckConstraint,
     Column,
@@ -38,8 +39,10 @@ from sqlalchemy import (
     UniqueConstraint,
     event,
     func,
+    inspect,
     or_,
     select,
+    text,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, declarative_base
@@ -70,6 +73,10 @@ from database.models import Base as ModelsBase
 Base = declarative_base()
 
 
+# Індекси, що дублюють унікальні обмеження; прибираються з наявних БД у ensure_schema
+_REDUNDANT_INDEXES = ("ix_cardcache_dept_article", "ix_photos_dept_article")
+
+
 # ------------------------------ Допоміжні типи -------------------------------
 
 class PhotoStatus(str, enum.Enum):
@@ -125,6 +132,11 @@ class Product(Base):
         Index("ix_products_article", "article"),
         Index("ix_products_dept", "dept_id"),
         Index("ix_products_active", "active"),
+        # Часткий індекс під вибірки лише активних товарів (звіти, пошук)
+        Index(
+            "ix_products_active_dept_article", "dept_id", "article",
+            postgresql_where=text("active"),
+        ),
     )
 
     # -------------------------------------------------------------------------
@@ -266,6 +278,7 @@ class ProductCardCache(Base):
 
     - card_json: мінімально достатній JSON для швидкого рендеру картки
     - file_id: останній валідний Telegram file_id фото (якщо є)
+    - payload_hash: 64-бітний геш card_json — незмінну картку не перезаписуємо
     """
 
     __tablename__ = "product_card_cache"
@@ -276,12 +289,14 @@ class ProductCardCache(Base):
 
     card_json = Column(JSON, nullable=False, default=dict)  # зберігаємо словник
     file_id = Column(String(256), nullable=True)
+    payload_hash = Column(BigInteger, nullable=True)
 
     updated_at = Column(DateTime, nullable=False, default=func.now())
 
+    # Унікальне обмеження вже дає B-tree індекс (dept_id, article) для
+    # get_card/set_card/invalidate — окремий звичайний індекс лише дублював би записи.
     __table_args__ = (
         UniqueConstraint("dept_id", "article", name="uq_cardcache_dept_article"),
-        Index("ix_cardcache_dept_article", "dept_id", "article"),
     )
 
 
@@ -289,7 +304,7 @@ class ProductPhoto(Base):
     """
     Фото товарів з модерацією.
 
-    - image_hash: короткий хеш для видалення дублікатів
+    - image_hash: 64-бітний pHash (signed BIGINT) для пошуку дублікатів за відстанню Геммінга
     - order_no: для сортування (1..3)
     """
 
@@ -300,7 +315,7 @@ class ProductPhoto(Base):
     article = Column(String(32), nullable=False)
 
     file_id = Column(String(256), nullable=False)
-    image_hash = Column(String(64), nullable=False)
+    image_hash = Column(BigInteger, nullable=True)  # NULL — легасі-геш, який не вдалось перетворити
 
     status = Column(String(16), nullable=False, default=PhotoStatus.PENDING.value)
     order_no = Column(Integer, nullable=False, default=1)
@@ -308,8 +323,12 @@ class ProductPhoto(Base):
     created_at = Column(DateTime, nullable=False, default=func.now())
     updated_at = Column(DateTime, nullable=False, default=func.now())
 
+    # uq_photos_dedupe — це й композитний індекс (dept_id, article, image_hash)
+    # для точної дедуплікації; ix_photos_lookup — для картки товару (перше схвалене
+    # фото за order_no: seek + впорядковане читання без сортування), а його префікс
+    # (dept_id, article) — для вибірки кандидатів товару.
     __table_args__ = (
-        Index("ix_photos_dept_article", "dept_id", "article"),
+        Index("ix_photos_lookup", "dept_id", "article", "status", "order_no"),
         UniqueConstraint("dept_id", "article", "image_hash", name="uq_photos_dedupe"),
         CheckConstraint("order_no >= 1 AND order_no <= 3", name="ck_photos_order_range"),
     )
@@ -419,6 +438,45 @@ def ensure_schema(engine) -> None:
     ModelsBase.metadata.create_all(bind=engine)
     # Потім створюємо таблиці, визначені у цьому модулі
     Base.metadata.create_all(bind=engine)
+    # create_all не додає нові індекси до вже наявних таблиць — доганяємо їх окремо
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for idx in table.indexes:
+                idx.create(bind=conn, checkfirst=True)
+        for name in _REDUNDANT_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        _migrate_photo_hash_to_bigint(conn)
+        _add_cardcache_payload_hash(conn)
+
+
+def _migrate_photo_hash_to_bigint(conn) -> None:
+    """
+    Старі БД зберігали image_hash як hex-рядок. Переводимо колонку в BIGINT
+    (той самий 64-бітний геш, знаковий), щоб рахувати Геммінга в SQL через XOR.
+    Некоректні значення стають NULL: такі фото просто не беруть участі в дедуплікації.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    cols = {c["name"]: c for c in inspect(conn).get_columns(ProductPhoto.__tablename__)}
+    col = cols.get("image_hash")
+    if col is None or isinstance(col["type"], BigInteger):
+        return
+    # Не-hex або довші за 16 символів значення не перетворюються без втрат —
+    # їх обнуляємо, щоб ALTER (і старт бота) не падав на «битих» рядках
+    conn.execute(text(
+        "ALTER TABLE product_photos ALTER COLUMN image_hash DROP NOT NULL, "
+        "ALTER COLUMN image_hash TYPE BIGINT USING CASE "
+        "WHEN lower(btrim(image_hash)) ~ '^[0-9a-f]{1,16}$' "
+        "THEN ('x' || lpad(lower(btrim(image_hash)), 16, '0'))::bit(64)::bigint "
+        "ELSE NULL END"
+    ))
+
+
+def _add_cardcache_payload_hash(conn) -> None:
+    """Додати колонку payload_hash у вже наявну product_card_cache (create_all її не додасть)."""
+    cols = {c["name"] for c in inspect(conn).get_columns(ProductCardCache.__tablename__)}
+    if "payload_hash" not in cols:
+        conn.execute(text("ALTER TABLE product_card_cache ADD COLUMN payload_hash BIGINT"))
 
 
 # ------------------------------ ORM‑функції -----------------------------------
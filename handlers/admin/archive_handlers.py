@@ -89,11 +89,11 @@ async def view_user_archive(callback: CallbackQuery, state: FSMContext):
             await show_users_archives_list(callback, state)
             return
 
-        response_lines = [LEXICON.USER_ARCHIVE_TITLE.format(user_id=user_id)]
+        response_lines = [LEXICON.render("USER_ARCHIVE_TITLE", user_id=user_id)]
         for i, lst in enumerate(archived_lists, 1):
             created_date = lst.created_at.strftime("%d.%m.%Y о %H:%M")
             response_lines.append(
-                LEXICON.ARCHIVE_ITEM.format(i=i, file_name=lst.file_name, created_date=created_date)
+                LEXICON.render("ARCHIVE_ITEM", i=i, file_name=lst.file_name, created_date=created_date)
             )
 
         await callback.message.edit_text(
@@ -116,7 +116,7 @@ async def download_zip_handler(callback: CallbackQuery, state: FSMContext, bot:
     try:
         user_id = int(callback.data.split(":")[-1])
         # --- ОНОВЛЕНО: Редагуємо повідомлення і прибираємо клавіатуру ---
-        await callback.message.edit_text(LEXICON.PACKING_ARCHIVE.format(user_id=user_id), reply_markup=None)
+        await callback.message.edit_text(LEXICON.render("PACKING_ARCHIVE", user_id=user_id), reply_markup=None)
 
         zip_path = await _pack_user_files_to_zip(user_id)
         if not zip_path:
@@ -128,7 +128,7 @@ async def download_zip_handler(callback: CallbackQuery, state: FSMContext, bot:
         await bot.send_document(
             chat_id=callback.from_user.id,
             document=FSInputFile(zip_path),
-            caption=LEXICON.ZIP_ARCHIVE_CAPTION.format(user_id=user_id)
+            caption=LEXICON.render("ZIP_ARCHIVE_CAPTION", user_id=user_id)
         )
         
         # --- ОНОВЛЕНО: Видаляємо тимчасове повідомлення і показуємо нове меню ---
@@ -140,7 +140,7 @@ async def download_zip_handler(callback: CallbackQuery, state: FSMContext, bot:
         logger.error("Некоректний callback_data для завантаження ZIP: %s", callback.data, exc_info=True)
         await callback.answer(LEXICON.UNEXPECTED_ERROR, show_alert=True)
     except Exception as e:
-        await callback.answer(LEXICON.ZIP_ERROR.format(error=str(e)), show_alert=True)
+        await callback.answer(LEXICON.render("ZIP_ERROR", error=str(e)), show_alert=True)
         # Якщо сталася помилка, все одно показуємо головне меню
         await _show_admin_panel(callback, state, bot)
     finally:
@@ -105,7 +105,7 @@ async def delete_all_lists_confirmed_handler(callback: CallbackQuery, state: FSM
 
     if deleted_count > 0:
         await callback.answer(
-            LEXICON.DELETE_ALL_LISTS_SUCCESS.format(count=deleted_count),
+            LEXICON.render("DELETE_ALL_LISTS_SUCCESS", count=deleted_count),
             show_alert=True
         )
     else:
@@ -28,18 +28,23 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
+import sys
 import time
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from aiogram import Bot, types, Dispatcher, F  # Dispatcher imported from aiogram root in v3
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from dotenv import load_dotenv
+from sqlalchemy import func, literal_column, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 # ------------------------------ КОНФІГ ---------------------------------------
 
@@ -61,13 +66,14 @@ ALLOWED_EXT = {".xlsx", ".xlsm", ".ods", ".csv"}
 
 # Кому дозволено імпорт (список ID через кому). Якщо порожньо — дозволено лише ADMIN_IDS.
 ADMIN_IDS_ENV = os.getenv("ADMIN_IDS", "")
-ADMIN_IDS = set(int(x) for x in ADMIN_IDS_ENV.replace(" ", "").split(",") if x.strip().isdigit())
+ADMIN_IDS = frozenset(int(x) for x in ADMIN_IDS_ENV.replace(" ", "").split(",") if x.strip().isdigit())
 
 
 # ---------------------- ІМПОРТИ УТИЛІТ НОРМАЛІЗАЦІЇ -------------------------
 
 from utils.io_spreadsheet import read_any_spreadsheet
 from utils.import_normalizer import normalize_import_table, NoArticlesError
+from handlers.user.product_bridge import clear_product_key_cache
 
 # ----------------------------- ORM І СЕСІЇ -----------------------------------
 # Підлаштуй під свій проєкт:
@@ -179,28 +185,38 @@ def _load_plan(token: str) -> ImportPlan:
 def _humanize_report(stats: Dict[str, float],
                       ins: int, upd: int, deact: int, deact_allowed: bool,
                       per_dept: Dict[str, Dict[str, float]]) -> str:
-    lines = []
-    lines.append("📥 <b>Dry-run імпорту</b>")
-    lines.append("")
-    lines.append(f"• Унікальних артикулів у файлі: <b>{int(stats.get('articles_unique', 0))}</b>")
-    lines.append(f"• Рядків у файлі: <b>{int(stats.get('rows_total', 0))}</b>")
-    lines.append("")
-    lines.append(f"✅ Додати: <b>{ins}</b>")
-    lines.append(f"🔁 Оновити: <b>{upd}</b>")
+    rows_total = int(stats.get("rows_total", 0))
+    rows_dedup = int(stats.get("rows_after_dedup", rows_total))
+    dedup_line = f"• Після прибирання дублікатів: <b>{rows_dedup}</b>\n" if rows_dedup != rows_total else ""
+
     if DEACTIVATE_MISSING:
         deact_line = f"🗂 Деактивувати (не у файлі): <b>{deact}</b>"
         if not deact_allowed and deact > 0:
             deact_line += "  <i>(порог перевищено, деактивацію вимкнено)</i>"
-        lines.append(deact_line)
     else:
-        lines.append("🗂 Деактивувати: <i>вимкнено налаштуванням</i>")
-    lines.append("")
+        deact_line = "🗂 Деактивувати: <i>вимкнено налаштуванням</i>"
+
+    # Ключі per_dept — вже рядки, тож сортуємо без key=
+    dept_block = ""
     if per_dept:
-        lines.append("<b>Суми по відділах:</b>")
-        for dept, d in sorted(per_dept.items(), key=lambda x: str(x[0])):
-            s = f"  • Відділ {dept}: унікальних артикулів — {int(d.get('unique', 0))}, сума — {d.get('sum', 0):.2f}"
-            lines.append(s)
-    return "\n".join(lines)
+        dept_block = "<b>Суми по відділах:</b>\n" + "\n".join(
+            f"  • Відділ {dept}: унікальних артикулів — {int(d.get('unique', 0))}, сума — {d.get('sum', 0):.2f}"
+            for dept, d in sorted(per_dept.items())
+        )
+
+    return (
+        f"📥 <b>Dry-run імпорту</b>\n"
+        f"\n"
+        f"• Унікальних артикулів у файлі: <b>{int(stats.get('articles_unique', 0))}</b>\n"
+        f"• Рядків у файлі: <b>{rows_total}</b>\n"
+        f"{dedup_line}"
+        f"\n"
+        f"✅ Додати: <b>{ins}</b>\n"
+        f"🔁 Оновити: <b>{upd}</b>\n"
+        f"{deact_line}\n"
+        f"\n"
+        f"{dept_block}"
+    )
 
 
 def _kb_confirm(token: str) -> InlineKeyboardMarkup:
@@ -227,6 +243,16 @@ def _kb_confirm(token: str) -> InlineKeyboardMarkup:
 
 # ------------------------------ ОСНОВНА ЛОГІКА --------------------------------
 
+def _column_array(df: pd.DataFrame, col: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Колонка як object-масив + булева маска пропусків (True — значення відсутнє).
+    Якщо колонки немає — масив із None і маска з одних True.
+    """
+    if col in df.columns:
+        return df[col].to_numpy(dtype=object), df[col].isna().to_numpy()
+    return np.full(len(df), None, dtype=object), np.ones(len(df), dtype=bool)
+
+
 def _prepare_import_plan(df: pd.DataFrame) -> ImportPlan:
     """
     Побудувати план імпорту: що додати, що оновити, що деактивувати.
@@ -235,15 +261,31 @@ def _prepare_import_plan(df: pd.DataFrame) -> ImportPlan:
     token = _short_token()
     plan = ImportPlan(token=token)
 
-    # Які відділи в імпорті
+    # Які відділи в імпорті. Рядки відділів інтернуємо: на сотні тисяч рядків
+    # припадає кілька різних значень, тож усі PlanItem ділять ті самі об'єкти.
     if "відділ" in df.columns:
-        involved_depts = sorted(set(str(x) for x in df["відділ"].dropna().astype(str).tolist()))
+        involved_depts = sorted(sys.intern(str(x)) for x in df["відділ"].dropna().astype(str).unique())
     else:
-        involved_depts = ["unknown"]
+        involved_depts = [sys.intern("unknown")]
     plan.involved_depts = involved_depts
 
-    # Підготуємо індекс для швидких зіставлень
-    df["__key"] = df.apply(lambda r: f"{str(r.get('відділ', 'unknown'))}::{str(r['артикул'])}", axis=1)
+    # Підготуємо індекс для швидких зіставлень (векторно, без DataFrame.apply)
+    if "відділ" in df.columns:
+        dept_s = df["відділ"].astype(str)
+        _dept_intern = {d: sys.intern(d) for d in dept_s.unique()}
+        dept_s = dept_s.map(_dept_intern)
+    else:
+        dept_s = pd.Series([involved_depts[0]] * len(df), index=df.index, dtype=object)
+    art_s = df["артикул"].astype(str)
+    df["__key"] = dept_s + "::" + art_s
+
+    # Дублікати (відділ, артикул) прибираємо одразу: перемагає останній рядок
+    rows_total = len(df)
+    keep = ~df["__key"].duplicated(keep="last")
+    if not keep.all():
+        df = df[keep].reset_index(drop=True)
+        dept_s = dept_s[keep].reset_index(drop=True)
+        art_s = art_s[keep].reset_index(drop=True)
 
     # Агрегати по відділах
     per_dept: Dict[str, Dict[str, float]] = {}
@@ -257,41 +299,56 @@ def _prepare_import_plan(df: pd.DataFrame) -> ImportPlan:
     with get_session() as s:
         # Усе, що у відділах з імпорту
         db_items = s.query(Product).filter(Product.dept_id.in_(involved_depts)).all()  # type: ignore
-        db_map: Dict[str, Product] = {f"{str(p.dept_id)}::{str(p.article)}": p for p in db_items}
+        db_map: Dict[str, Tuple[str, str]] = {
+            f"{p.dept_id}::{p.article}": (str(p.article), sys.intern(str(p.dept_id))) for p in db_items
+        }
 
     # Визначаємо вставки/оновлення
     to_insert: List[PlanItem] = []
     to_update: List[PlanItem] = []
 
-    def _row2item(row: pd.Series) -> PlanItem:
+    # Struct-of-Arrays: кожну колонку витягуємо один раз, далі — доступ за індексом
+    arr_keys = df["__key"].to_numpy()
+    arr_article = art_s.to_numpy()
+    arr_dept = dept_s.to_numpy()
+    # Маски пропусків рахуємо один раз векторно — у циклі жодного pd.isna()
+    arr_name, mask_name = _column_array(df, "назва")
+    arr_qty, mask_qty = _column_array(df, "кількість")
+    arr_price, mask_price = _column_array(df, "ціна")
+    arr_months, mask_months = _column_array(df, "місяців без руху")
+
+    def _row2item(i: int) -> PlanItem:
         return PlanItem(
-            article=str(row.get("артикул")),
-            dept_id=str(row.get("відділ", "unknown")),
-            name=str(row.get("назва")) if not pd.isna(row.get("назва")) else None,
-            qty=float(row.get("кількість")) if "кількість" in row and not pd.isna(row.get("кількість")) else None,
-            price=float(row.get("ціна")) if "ціна" in row and not pd.isna(row.get("ціна")) else None,
-            months_no_move=float(row.get("місяців без руху")) if "місяців без руху" in row and not pd.isna(row.get("місяців без руху")) else None,
+            article=arr_article[i],
+            dept_id=arr_dept[i],
+            name=None if mask_name[i] else str(arr_name[i]),
+            qty=None if mask_qty[i] else float(arr_qty[i]),
+            price=None if mask_price[i] else float(arr_price[i]),
+            months_no_move=None if mask_months[i] else float(arr_months[i]),
         )
 
-    for _, row in df.iterrows():
-        key = row["__key"]
-        if key in db_map:
-            to_update.append(_row2item(row))
+    for i in range(len(df)):
+        if arr_keys[i] in db_map:
+            to_update.append(_row2item(i))
         else:
-            to_insert.append(_row2item(row))
+            to_insert.append(_row2item(i))
 
-    # Кандидати на деактивацію: те, що є в БД у цих відділах, але нема у файлі
-    imported_keys = set(df["__key"].tolist())
+    # Кандидати на деактивацію: те, що є в БД у цих відділах, але нема у файлі.
+    # Якщо деактивацію вимкнено налаштуванням — не рахуємо взагалі.
     to_deactivate: List[Tuple[str, str]] = []
-    for key, item in db_map.items():
-        if key not in imported_keys and DEACTIVATE_MISSING:
-            to_deactivate.append((str(item.article), str(item.dept_id)))
-
-    # Поріг масової деактивації
-    deactivate_allowed = True
-    total_db_involved = len(db_map) or 1  # щоб уникнути ділення на нуль
-    share = len(to_deactivate) / float(total_db_involved)
-    if share > MAX_DEACTIVATE_SHARE:
+    if DEACTIVATE_MISSING:
+        imported_keys = set(df["__key"].tolist())
+        for key, pair in db_map.items():
+            if key not in imported_keys:
+                to_deactivate.append(pair)
+
+        # Поріг масової деактивації
+        deactivate_allowed = True
+        total_db_involved = len(db_map) or 1  # щоб уникнути ділення на нуль
+        share = len(to_deactivate) / float(total_db_involved)
+        if share > MAX_DEACTIVATE_SHARE:
+            deactivate_allowed = False
+    else:
         deactivate_allowed = False
 
     # Пакуємо
@@ -299,12 +356,79 @@ def _prepare_import_plan(df: pd.DataFrame) -> ImportPlan:
     plan.to_update = to_update
     plan.to_deactivate = to_deactivate
     plan.deactivate_allowed = deactivate_allowed
-    plan.stats = {"rows_total": float(len(df)), "articles_unique": float(df["артикул"].nunique())}
+    plan.stats = {
+        "rows_total": float(rows_total),
+        "rows_after_dedup": float(len(df)),
+        "articles_unique": float(df["артикул"].nunique()),
+    }
     plan.human_report = _humanize_report(plan.stats, len(to_insert), len(to_update), len(to_deactivate), deactivate_allowed, per_dept)
 
     return plan
 
 
+# Скільки рядків в одному INSERT ... ON CONFLICT (ліміт параметрів у PostgreSQL — 65535)
+UPSERT_CHUNK = 5000
+
+# Поля, які оновлюються з файлу, і їхні значення за замовчуванням для нових рядків
+_UPSERT_FIELDS: Dict[str, object] = {"name": "", "qty": 0.0, "price": 0.0, "months_no_move": 0.0}
+
+
+def _apply_import_plan(plan: ImportPlan) -> Tuple[int, int, int]:
+    """
+    Синхронно записати план у БД. Повертає (додано, оновлено, деактивовано).
+
+    Вставка/оновлення — нативний UPSERT (INSERT ... ON CONFLICT (dept_id, article)
+    DO UPDATE), деактивація — один масовий UPDATE.
+    """
+    # Ключі в плані унікальні (дедуплікація у _prepare_import_plan),
+    # тож ON CONFLICT не зустріне той самий рядок двічі в одній команді.
+    # Групуємо за набором заповнених полів: оновлюємо лише те, що прийшло у файлі
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    for it in plan.to_insert + plan.to_update:
+        present = tuple(f for f in _UPSERT_FIELDS if getattr(it, f) is not None)
+        row = {"dept_id": it.dept_id, "article": it.article, "active": True}
+        for f, default in _UPSERT_FIELDS.items():
+            v = getattr(it, f)
+            row[f] = v if v is not None else default
+        groups.setdefault(present, []).append(row)
+
+    ins_cnt = upd_cnt = deact_cnt = 0
+    with get_session() as s:
+        for present, rows in groups.items():
+            for i in range(0, len(rows), UPSERT_CHUNK):
+                stmt = pg_insert(Product).values(rows[i:i + UPSERT_CHUNK])
+                set_ = {f: getattr(stmt.excluded, f) for f in present}
+                set_["active"] = True
+                set_["updated_at"] = func.now()
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["dept_id", "article"],
+                    set_=set_,
+                ).returning(literal_column("(xmax = 0)"))
+                # xmax = 0 → рядок щойно вставлено, інакше — оновлено
+                for (inserted,) in s.execute(stmt):
+                    if inserted:
+                        ins_cnt += 1
+                    else:
+                        upd_cnt += 1
+
+        # DEACTIVATE
+        if DEACTIVATE_MISSING and plan.deactivate_allowed and plan.to_deactivate:
+            keys = [(dept, art) for art, dept in plan.to_deactivate]
+            for i in range(0, len(keys), UPSERT_CHUNK):
+                res = s.execute(
+                    update(Product)
+                    .where(tuple_(Product.dept_id, Product.article).in_(keys[i:i + UPSERT_CHUNK]))
+                    .where(Product.active.is_(True))
+                    .values(active=False, updated_at=func.now())
+                )
+                deact_cnt += res.rowcount or 0
+
+        s.commit()
+    # Довідник переписано — кеш id → (dept_id, article) будуємо заново
+    clear_product_key_cache()
+    return ins_cnt, upd_cnt, deact_cnt
+
+
 # ----------------------------- ХЕНДЛЕРИ TG -----------------------------------
 
 async def _handle_import_file(message: types.Message, bot: Bot) -> None:
@@ -334,9 +458,10 @@ async def _handle_import_file(message: types.Message, bot: Bot) -> None:
 
     # Прочитати і нормалізувати
     try:
-        # read_any_spreadsheet expects a string path; convert Path to str
-        raw_df = read_any_spreadsheet(str(saved_path))
-        norm = normalize_import_table(raw_df).require_any_articles()
+        # read_any_spreadsheet expects a string path; convert Path to str.
+        # Важкі CPU-кроки виконуємо в потоці, щоб не блокувати event loop.
+        raw_df = await asyncio.to_thread(read_any_spreadsheet, str(saved_path))
+        norm = await asyncio.to_thread(lambda: normalize_import_table(raw_df).require_any_articles())
     except NoArticlesError:
         await message.answer("⚠️ Імпорт скасовано: не знайдено жодного артикула у файлі.\n"
                              "Базу не змінено.")
@@ -349,7 +474,7 @@ async def _handle_import_file(message: types.Message, bot: Bot) -> None:
         return
 
     # Побудувати план dry-run
-    plan = _prepare_import_plan(norm.df)
+    plan = await asyncio.to_thread(_prepare_import_plan, norm.df)
 
     # Якщо немає жодного запису на додавання/оновлення/деактивацію — повідомити
     if not plan.to_insert and not plan.to_update and not (DEACTIVATE_MISSING and plan.to_deactivate):
@@ -384,74 +509,7 @@ async def _cb_apply_import(cb: types.CallbackQuery) -> None:
 
     # Застосування плану
     try:
-        ins_cnt = upd_cnt = deact_cnt = 0
-        with get_session() as s:
-            # Індекси існуючих
-            existing: Dict[Tuple[str, str], Product] = {}
-            q = s.query(Product).filter(Product.dept_id.in_(plan.involved_depts))
-            for p in q.all():  # type: ignore
-                existing[(str(p.article), str(p.dept_id))] = p
-
-            # INSERT
-            for it in plan.to_insert:
-                key = (it.article, it.dept_id)
-                if key in existing:
-                    # параноя: якщо раптом з'явився за час dry-run → в оновлення
-                    p = existing[key]
-                    if it.name is not None:
-                        p.name = it.name
-                    if it.qty is not None:
-                        p.qty = it.qty
-                    if it.price is not None:
-                        p.price = it.price
-                    if it.months_no_move is not None:
-                        p.months_no_move = it.months_no_move
-                    p.active = True  # на всяк випадок
-                    upd_cnt += 1
-                else:
-                    p = Product()  # type: ignore
-                    p.article = it.article
-                    p.dept_id = it.dept_id
-                    p.name = it.name or ""
-                    p.qty = it.qty or 0
-                    p.price = it.price or 0
-                    p.months_no_move = it.months_no_move or 0
-                    p.active = True
-                    s.add(p)
-                    ins_cnt += 1
-
-            # UPDATE
-            for it in plan.to_update:
-                key = (it.article, it.dept_id)
-                p = existing.get(key)
-                if not p:
-                    # хтось видалив між dry-run і apply — перетворимо на insert
-                    p = Product()  # type: ignore
-                    p.article = it.article
-                    p.dept_id = it.dept_id
-                    p.active = True
-                    s.add(p)
-                    ins_cnt += 1
-                # оновлення полів
-                if it.name is not None:
-                    p.name = it.name
-                if it.qty is not None:
-                    p.qty = it.qty
-                if it.price is not None:
-                    p.price = it.price
-                if it.months_no_move is not None:
-                    p.months_no_move = it.months_no_move
-                p.active = True
-
-            # DEACTIVATE
-            if DEACTIVATE_MISSING and plan.deactivate_allowed and plan.to_deactivate:
-                for art, dept in plan.to_deactivate:
-                    p = existing.get((art, dept))
-                    if p and getattr(p, "active", True):
-                        p.active = False
-                        deact_cnt += 1
-
-            s.commit()
+        ins_cnt, upd_cnt, deact_cnt = await asyncio.to_thread(_apply_import_plan, plan)
 
         msg = [
             "✅ <b>Імпорт застосовано</b>",
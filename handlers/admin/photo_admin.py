@@ -33,15 +33,31 @@ from utils.card_cache import update_file_id, invalidate  # type: ignore
 
 router = Router(name="photo_admin")
 
+# Telegram дозволяє до 10 елементів в одній media group
+MEDIA_GROUP_SIZE = 10
+
+# Префікси callback_data: розбираємо зрізом, без проміжних списків від split()
+_OPEN_PREFIX = "photo:open:"
+_APPROVE_PREFIX = "photo:approve:"
+_REJECT_PREFIX = "photo:reject:"
+_ORDER_PREFIX = "photo:order:"
+_SET_MAIN_PREFIX = "photo:set_main:"
+_OPEN_PREFIX_LEN = len(_OPEN_PREFIX)
+_APPROVE_PREFIX_LEN = len(_APPROVE_PREFIX)
+_REJECT_PREFIX_LEN = len(_REJECT_PREFIX)
+_ORDER_PREFIX_LEN = len(_ORDER_PREFIX)
+_SET_MAIN_PREFIX_LEN = len(_SET_MAIN_PREFIX)
+
 # --------------------------- Допоміжні клавіатури -----------------------------
 
-def _kb_pending_item(photo_id: int) -> InlineKeyboardMarkup:
-    kb = InlineKeyboardMarkup(
+def _kb_pending_group(photo_ids: List[int]) -> InlineKeyboardMarkup:
+    """Кнопки «Відкрити» для пачки фото (media group не підтримує клавіатури)."""
+    return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="👁 Відкрити", callback_data=f"photo:open:{photo_id}")],
+            [InlineKeyboardButton(text=f"👁 Відкрити {pid}", callback_data=f"photo:open:{pid}")]
+            for pid in photo_ids
         ]
     )
-    return kb
 
 
 def _kb_photo_actions(dept_id: str, article: str, photo_id: int, current_order: int) -> InlineKeyboardMarkup:
@@ -65,7 +81,7 @@ def _kb_photo_actions(dept_id: str, article: str, photo_id: int, current_order:
 
 def _get_photo(photo_id: int) -> Optional[ProductPhoto]:
     with get_session() as s:
-        return s.query(ProductPhoto).filter(ProductPhoto.id == int(photo_id)).one_or_none()
+        return s.get(ProductPhoto, int(photo_id))
 
 
 def _list_pending(limit: int = 20) -> List[ProductPhoto]:
@@ -74,25 +90,23 @@ def _list_pending(limit: int = 20) -> List[ProductPhoto]:
         return q.limit(limit).all()  # type: ignore
 
 
-def _set_status(photo_id: int, status: str) -> Optional[ProductPhoto]:
-    with get_session() as s:
-        row = s.query(ProductPhoto).filter(ProductPhoto.id == int(photo_id)).one_or_none()
-        if not row:
-            return None
-        row.status = status
-        s.commit()
-        return row
+def _set_status(s, photo_id: int, status: str) -> Optional[ProductPhoto]:
+    """Змінити статус у відкритій сесії (commit — на боці виклику)."""
+    row = s.get(ProductPhoto, int(photo_id))
+    if not row:
+        return None
+    row.status = status
+    return row
 
 
-def _set_order(photo_id: int, order_no: int) -> Optional[ProductPhoto]:
+def _set_order(s, photo_id: int, order_no: int) -> Optional[ProductPhoto]:
+    """Змінити порядок у відкритій сесії (commit — на боці виклику)."""
     order_no = max(1, min(3, int(order_no)))
-    with get_session() as s:
-        row = s.query(ProductPhoto).filter(ProductPhoto.id == int(photo_id)).one_or_none()
-        if not row:
-            return None
-        row.order_no = order_no
-        s.commit()
-        return row
+    row = s.get(ProductPhoto, int(photo_id))
+    if not row:
+        return None
+    row.order_no = order_no
+    return row
 
 
 # ------------------------------ Команди/хендлери ------------------------------
@@ -107,29 +121,38 @@ async def photos_pending(message: Message):
         await message.answer("Немає фото у статусі pending.")
         return
 
-    for r in rows:
-        caption = f"ID: {r.id}\nВідділ: {r.dept_id}\nАртикул: {r.article}\nСтатус: {r.status}\nПорядок: {r.order_no}"
-        if r.file_id:
-            await message.answer_photo(
-                photo=r.file_id,
-                caption=caption,
-                reply_markup=_kb_pending_item(r.id),
-            )
-        else:
-            await message.answer(
-                text=caption,
-                reply_markup=_kb_pending_item(r.id),
+    # Пачками по 10: одна media group + одне повідомлення з кнопками на пачку
+    for start in range(0, len(rows), MEDIA_GROUP_SIZE):
+        chunk = rows[start:start + MEDIA_GROUP_SIZE]
+        media = [
+            InputMediaPhoto(
+                media=r.file_id,
+                caption=f"ID: {r.id}\nВідділ: {r.dept_id}\nАртикул: {r.article}\nСтатус: {r.status}\nПорядок: {r.order_no}",
             )
+            for r in chunk if r.file_id
+        ]
+        if len(media) > 1:
+            await message.answer_media_group(media=media)
+        elif media:
+            await message.answer_photo(photo=media[0].media, caption=media[0].caption)
+
+        lines = [
+            f"ID {r.id}: {r.dept_id}/{r.article}" + ("" if r.file_id else " (без фото)")
+            for r in chunk
+        ]
+        await message.answer(
+            text="Фото на модерації:\n" + "\n".join(lines),
+            reply_markup=_kb_pending_group([r.id for r in chunk]),
+        )
 
 
-@router.callback_query(F.data.startswith("photo:open:"))
+@router.callback_query(F.data.startswith(_OPEN_PREFIX))
 async def cb_open_photo(cb: CallbackQuery):
     """
     Відкрити картку модерації одного фото.
     """
     try:
-        _, _, id_str = cb.data.split(":", 2)
-        pid = int(id_str)
+        pid = int(cb.data[_OPEN_PREFIX_LEN:])
     except Exception:
         await cb.answer("Помилковий ID", show_alert=True)
         return
@@ -158,76 +181,83 @@ async def cb_open_photo(cb: CallbackQuery):
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("photo:approve:"))
+@router.callback_query(F.data.startswith(_APPROVE_PREFIX))
 async def cb_approve_photo(cb: CallbackQuery):
     """
     Підтвердити фото: status -> approved, інвалідація кешу картки.
     """
     try:
-        _, _, id_str = cb.data.split(":", 2)
-        pid = int(id_str)
+        pid = int(cb.data[_APPROVE_PREFIX_LEN:])
     except Exception:
         await cb.answer("Помилковий ID", show_alert=True)
         return
 
-    row = _set_status(pid, "approved")
+    # Одна сесія: зміна статусу + інвалідація картки, щоб підхопила схвалене фото
+    with get_session() as s:
+        row = _set_status(s, pid, "approved")
+        if row:
+            invalidate(s, str(row.dept_id), str(row.article))
+            kb = _kb_photo_actions(str(row.dept_id), str(row.article), row.id, row.order_no)
+            s.commit()
     if not row:
         await cb.answer("Фото не знайдено", show_alert=True)
         return
 
-    # Інвалідуємо картку — щоб підхопила схвалене фото
-    with get_session() as s:
-        invalidate(s, str(row.dept_id), str(row.article))
-        s.commit()
-
     await cb.answer("Схвалено ✅", show_alert=False)
-    await cb.message.edit_reply_markup(reply_markup=_kb_photo_actions(str(row.dept_id), str(row.article), row.id, row.order_no))
+    await cb.message.edit_reply_markup(reply_markup=kb)
 
 
-@router.callback_query(F.data.startswith("photo:reject:"))
+@router.callback_query(F.data.startswith(_REJECT_PREFIX))
 async def cb_reject_photo(cb: CallbackQuery):
     """
     Відхилити фото: status -> rejected.
     """
     try:
-        _, _, id_str = cb.data.split(":", 2)
-        pid = int(id_str)
+        pid = int(cb.data[_REJECT_PREFIX_LEN:])
     except Exception:
         await cb.answer("Помилковий ID", show_alert=True)
         return
 
-    row = _set_status(pid, "rejected")
+    with get_session() as s:
+        row = _set_status(s, pid, "rejected")
+        if row:
+            kb = _kb_photo_actions(str(row.dept_id), str(row.article), row.id, row.order_no)
+            s.commit()
     if not row:
         await cb.answer("Фото не знайдено", show_alert=True)
         return
 
     await cb.answer("Відхилено 🗑", show_alert=False)
-    await cb.message.edit_reply_markup(reply_markup=_kb_photo_actions(str(row.dept_id), str(row.article), row.id, row.order_no))
+    await cb.message.edit_reply_markup(reply_markup=kb)
 
 
-@router.callback_query(F.data.startswith("photo:order:"))
+@router.callback_query(F.data.startswith(_ORDER_PREFIX))
 async def cb_set_order(cb: CallbackQuery):
     """
     Змінити порядок показу (1..3). Не змінює статус.
     """
     try:
-        _, _, id_str, order_str = cb.data.split(":", 3)
+        id_str, _, order_str = cb.data[_ORDER_PREFIX_LEN:].partition(":")
         pid = int(id_str)
         order_no = int(order_str)
     except Exception:
         await cb.answer("Формат: order 1..3", show_alert=True)
         return
 
-    row = _set_order(pid, order_no)
+    with get_session() as s:
+        row = _set_order(s, pid, order_no)
+        if row:
+            kb = _kb_photo_actions(str(row.dept_id), str(row.article), row.id, row.order_no)
+            s.commit()
     if not row:
         await cb.answer("Фото не знайдено", show_alert=True)
         return
 
     await cb.answer(f"Порядок → {order_no}", show_alert=False)
-    await cb.message.edit_reply_markup(reply_markup=_kb_photo_actions(str(row.dept_id), str(row.article), row.id, row.order_no))
+    await cb.message.edit_reply_markup(reply_markup=kb)
 
 
-@router.callback_query(F.data.startswith("photo:set_main:"))
+@router.callback_query(F.data.startswith(_SET_MAIN_PREFIX))
 async def cb_set_main(cb: CallbackQuery):
     """
     Позначити фото як основне для картки:
@@ -235,22 +265,23 @@ async def cb_set_main(cb: CallbackQuery):
     - інвалідуємо картку, щоб наступне відкриття підтягнуло актуальний file_id
     """
     try:
-        _, _, dept_id, article, id_str = cb.data.split(":", 4)
+        dept_id, article, id_str = cb.data[_SET_MAIN_PREFIX_LEN:].split(":", 2)
         pid = int(id_str)
     except Exception:
         await cb.answer("Помилкові дані", show_alert=True)
         return
 
-    row = _get_photo(pid)
-    if not row or str(row.dept_id) != str(dept_id) or str(row.article) != str(article):
+    # Одна сесія: перевірка фото + оновлення file_id у кеші як основного
+    with get_session() as s:
+        row = s.get(ProductPhoto, pid)
+        found = bool(row) and str(row.dept_id) == str(dept_id) and str(row.article) == str(article)
+        if found:
+            update_file_id(s, str(dept_id), str(article), row.file_id)
+            # Одразу інвалідуємо картку, щоб payload перегенерувався з актуальним file_id
+            invalidate(s, str(dept_id), str(article))
+            s.commit()
+    if not found:
         await cb.answer("Фото не знайдено", show_alert=True)
         return
 
-    # Оновити file_id у кеші як основний
-    with get_session() as s:
-        update_file_id(s, str(dept_id), str(article), row.file_id)
-        # Одразу інвалідуємо картку, щоб payload перегенерувався з актуальним file_id
-        invalidate(s, str(dept_id), str(article))
-        s.commit()
-
     await cb.answer("Призначено основним ⭐", show_alert=False)
@@ -8,7 +8,8 @@
     • кількість УНІКАЛЬНИХ артикулів
     • сумарна кількість (шт) та оціночна сума (qty * price), за бажанням
     • середня/медіанна ціна (опційно)
-- Експорт у .xlsx/.ods/.csv з єдиним API.
+- Експорт у .xlsx/.ods/.csv з єдиним API; для програмних викликів — також
+  .parquet/.feather (потрібен опційний pyarrow).
 - Іменування файлів:
     report_<тип>_<dept|all>_<ДД.ММ.РРРР_ГГ.ММ>.<ext>
 - Ретеншн: підчищення старих файлів з каталогу exports/.
@@ -26,19 +27,24 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
+import aiofiles
+from cachetools import TTLCache
 from aiogram import types, Dispatcher  # Dispatcher imported from aiogram root
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.filters import Command  # Added for command filtering
 from dotenv import load_dotenv
-from sqlalchemy import and_
+from sqlalchemy import and_, func, select
 
 from database.orm.products import Product  # type: ignore
+from database.engine import sync_engine  # type: ignore
 from database.session import get_session  # type: ignore
 
 from utils.io_spreadsheet import write_table
@@ -53,16 +59,36 @@ EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
 # Ретеншн у днях (0 або від’ємне — не чистити)
 EXPORTS_RETENTION_DAYS = int(os.getenv("EXPORTS_RETENTION_DAYS", "30") or 0)
 
-# Дозволені формати експорту
-ALLOWED_EXPORT_EXT = ("xlsx", "ods", "csv")
+# Розмір пачки рядків для потокового запису CSV
+EXPORTS_CSV_CHUNK = max(1, int(os.getenv("EXPORTS_CSV_CHUNK", "50000") or 50000))
+
+# Пакетне видалення старих експортів через io_uring (лише Linux + пакет liburing).
+# 0 — завжди звичайний os.unlink.
+EPICSERVICE_IO_URING = os.getenv("EPICSERVICE_IO_URING", "1") == "1"
+# Нижче цього порогу звичайний os.unlink швидший за підготовку кільця
+IO_URING_MIN_BATCH = 16
+IO_URING_ENTRIES = 128
+
+# Скільки секунд тримати зведення по відділах для повторних однакових звітів
+REPORTS_CACHE_TTL = int(os.getenv("REPORTS_CACHE_TTL", "60") or 60)
+
+# Файли до цього розміру відправляємо з пам'яті, більші — потоково з диска
+SEND_IN_MEMORY_MAX_BYTES = 10 * 1024 * 1024
+
+# Дозволені формати експорту. parquet/feather — колонкові бінарні формати для
+# внутрішньої передачі (потрібен pyarrow); у Telegram надсилаємо xlsx.
+ALLOWED_EXPORT_EXT = ("xlsx", "ods", "csv", "parquet", "feather")
 
 # Хто може викликати звіти (якщо логіка прав спрощена)
-ADMIN_IDS = set(int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x.strip().isdigit())
+ADMIN_IDS = frozenset(int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x.strip().isdigit())
 
 # ------------------------------ Хелпери --------------------------------------
 
+_TS_FORMAT = "%d.%m.%Y_%H.%M"
+
+
 def _ts_str() -> str:
-    return time.strftime("%d.%m.%Y_%H.%M")
+    return time.strftime(_TS_FORMAT)
 
 
 def _ensure_ext(ext: str) -> str:
@@ -89,83 +115,95 @@ def _cleanup_old_exports(retention_days: int = EXPORTS_RETENTION_DAYS) -> int:
     """
     if retention_days <= 0:
         return 0
-    import datetime as dt
-    now = dt.datetime.now()
+    # Один поріг на весь прохід; DirEntry.stat() на Linux не робить зайвих syscalls.
+    # (retention_days + 1) доби — те саме правило «.days > retention_days», що й раніше
+    # та що в utils.storage.cleanup_old
+    cutoff = time.time() - (retention_days + 1) * 86400
+    victims: List[str] = []
+    with os.scandir(EXPORTS_DIR) as it:
+        for e in it:
+            try:
+                if e.is_file(follow_symlinks=False) and e.stat(follow_symlinks=False).st_mtime < cutoff:
+                    victims.append(e.path)
+            except OSError:
+                # не критично
+                pass
+    if not victims:
+        return 0
+
+    if EPICSERVICE_IO_URING and len(victims) > IO_URING_MIN_BATCH:
+        removed = _unlink_many_io_uring(victims)
+        if removed is not None:
+            return removed
+
     removed = 0
-    for p in EXPORTS_DIR.glob("*.*"):
+    for path in victims:
         try:
-            mtime = dt.datetime.fromtimestamp(p.stat().st_mtime)
-            if (now - mtime).days > retention_days:
-                p.unlink(missing_ok=True)
-                removed += 1
-        except Exception:
-            # не критично
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            # вже видалено (наприклад, частково відпрацював io_uring)
+            removed += 1
+        except OSError:
             pass
     return removed
 
 
-def _df_unique_articles(products: Iterable[Product]) -> pd.DataFrame:
-    """
-    Повертає DataFrame з унікальними артикулами (dept_id, article, name, qty, price, sum).
-    Кількість унікальних артикулів рахується по (dept_id, article).
+def _unlink_many_io_uring(paths: List[str]) -> Optional[int]:
     """
-    rows: List[Dict[str, object]] = []
-    for p in products:
-        qty = float(getattr(p, "qty", 0.0) or 0.0)
-        price = float(getattr(p, "price", 0.0) or 0.0)
-        rows.append({
-            "відділ": str(getattr(p, "dept_id")),
-            "артикул": str(getattr(p, "article")),
-            "назва": str(getattr(p, "name") or ""),
-            "кількість": qty,
-            "ціна": price,
-            "сума": qty * price,
-            "активний": bool(getattr(p, "active", True)),
-            "місяців без руху": float(getattr(p, "months_no_move", 0.0) or 0.0),
-        })
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return pd.DataFrame(columns=["відділ", "артикул", "назва", "кількість", "ціна", "сума", "активний", "місяців без руху"])
-    return df
-
-
-def _per_dept_summary(df: pd.DataFrame) -> pd.DataFrame:
+    Видалити файли пачками IORING_OP_UNLINKAT (один io_uring_enter на пачку).
+    Повертає кількість видалених або None, якщо io_uring недоступний — тоді
+    виклик має відпрацювати звичайним os.unlink.
     """
-    Зведення по відділах:
-      • унікальних артикулів
-      • загальна кількість (шт)
-      • загальна сума
-      • середня ціна (зважена по кількості, якщо можливо)
-    """
-    if df.empty:
-        return pd.DataFrame(columns=["відділ", "унікальних артикулів", "шт (∑)", "сума (∑)", "середня ціна"])
-    grp = df.groupby("відділ", dropna=False)
-
-    def _weighted_avg_price(g: pd.DataFrame) -> float:
-        qty = g.get("кількість")
-        price = g.get("ціна")
-        if qty is None or price is None or qty.fillna(0).sum() == 0:
-            return float(price.fillna(0).mean()) if price is not None else 0.0
-        return float((price.fillna(0) * qty.fillna(0)).sum() / qty.fillna(0).sum())
-
-    res = pd.DataFrame({
-        "унікальних артикулів": grp["артикул"].nunique(),
-        "шт (∑)": grp["кількість"].sum(min_count=1),
-        "сума (∑)": grp["сума"].sum(min_count=1)
-    }).reset_index()
-
-    # Середня ціна окремо
-    avg_rows = []
-    for dept, g in grp:
-        avg_rows.append({"відділ": dept, "середня ціна": _weighted_avg_price(g)})
-    avg_df = pd.DataFrame(avg_rows)
-
-    out = pd.merge(res, avg_df, on="відділ", how="left")
-    # Приведення форматів
-    for c in ["шт (∑)", "сума (∑)", "середня ціна"]:
-        if c in out.columns:
-            out[c] = out[c].fillna(0.0).astype(float)
-    return out.sort_values(by="відділ")
+    try:
+        import liburing  # type: ignore
+    except ImportError:
+        return None
+
+    try:
+        ring = liburing.io_uring()
+        cqes = liburing.io_uring_cqes()
+        liburing.io_uring_queue_init(IO_URING_ENTRIES, ring, 0)
+    except Exception:
+        return None
+
+    removed = 0
+    try:
+        for start in range(0, len(paths), IO_URING_ENTRIES):
+            batch = paths[start:start + IO_URING_ENTRIES]
+            for path in batch:
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_unlinkat(sqe, os.fsencode(path), 0, liburing.AT_FDCWD)
+            liburing.io_uring_submit_and_wait(ring, len(batch))
+            for _ in batch:
+                liburing.io_uring_wait_cqe(ring, cqes)
+                cqe = cqes[0]
+                if cqe.res >= 0:
+                    removed += 1
+                liburing.io_uring_cqe_seen(ring, cqe)
+    except Exception:
+        # Несумісна версія біндингу тощо — решту доробить os.unlink
+        return None
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return removed
+
+
+REPORT_COLUMNS = ["відділ", "артикул", "назва", "кількість", "ціна", "сума", "активний", "місяців без руху"]
+
+# Розмір пачки рядків при потоковому читанні товарів для звіту
+REPORT_STREAM_CHUNK = 10_000
+
+# Назви колонок БД → колонки звіту
+_SQL_TO_REPORT = {
+    "dept_id": "відділ",
+    "article": "артикул",
+    "name": "назва",
+    "qty": "кількість",
+    "price": "ціна",
+    "active": "активний",
+    "months_no_move": "місяців без руху",
+}
 
 
 # ------------------------------ Основні API ----------------------------------
@@ -175,7 +213,7 @@ class ReportOptions:
     """Опції звітів."""
     dept_id: Optional[str] = None       # якщо None — всі відділи
     include_inactive: bool = False      # включати неактивні
-    fmt: str = "xlsx"                   # "xlsx" | "ods" | "csv"
+    fmt: str = "xlsx"                   # "xlsx" | "ods" | "csv" | "parquet" | "feather"
     kind: str = "unique"                # тип звіту для імені файлу
     sheet_name: str = "Звіт"            # ім'я аркуша для Excel/ODS
 
@@ -184,21 +222,90 @@ def build_products_df(opts: ReportOptions) -> pd.DataFrame:
     """
     Витягти дані з БД під звіт.
     """
+    # Лише потрібні колонки і напряму в DataFrame — без ORM-об'єктів та identity map
+    stmt = select(
+        Product.dept_id, Product.article, Product.name, Product.qty,
+        Product.price, Product.active, Product.months_no_move,
+    )
+    if opts.dept_id:
+        stmt = stmt.where(Product.dept_id == str(opts.dept_id))
+    if not opts.include_inactive:
+        stmt = stmt.where(Product.active.is_(True))
+    # Серверний курсор + пачки: великий каталог не вантажиться в пам'ять драйвера цілком
+    with sync_engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, yield_per=REPORT_STREAM_CHUNK)
+        chunks = list(pd.read_sql_query(stmt, conn, chunksize=REPORT_STREAM_CHUNK))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(_SQL_TO_REPORT))
+
+    df = df.rename(columns=_SQL_TO_REPORT)
+    # float64: у float32 лише ~7 значущих цифр — суми в гривнях округлювались би до копійок
+    num = df[["кількість", "ціна", "місяців без руху"]].astype(np.float64).fillna(0.0)
+    # Результат збираємо одним конструктором замість присвоєння колонок по одній
+    return pd.DataFrame({
+        "відділ": df["відділ"].astype(str),
+        "артикул": df["артикул"].astype(str),
+        "назва": df["назва"].fillna(""),
+        "кількість": num["кількість"],
+        "ціна": num["ціна"],
+        "сума": num["кількість"] * num["ціна"],
+        "активний": df["активний"].fillna(True).astype(bool),
+        "місяців без руху": num["місяців без руху"],
+    }, columns=REPORT_COLUMNS)
+
+
+_SUMMARY_CACHE: TTLCache = TTLCache(maxsize=32, ttl=max(1, REPORTS_CACHE_TTL))
+_SUMMARY_CACHE_LOCK = threading.Lock()
+
+
+def build_summary_df_sql(opts: ReportOptions) -> pd.DataFrame:
+    """
+    Зведення по відділах (унікальні артикули, шт, сума, середня ціна,
+    зважена по кількості). Агрегація виконується в БД: з бази приходить по
+    одному рядку на відділ, а не весь перелік товарів.
+    Результат коротко кешується за (dept_id, include_inactive), щоб повторні
+    натискання кнопок звітів не ганяли агрегацію по всьому каталогу;
+    повертається неглибока копія.
+    """
+    key = (opts.dept_id, opts.include_inactive)
+    with _SUMMARY_CACHE_LOCK:
+        cached = _SUMMARY_CACHE.get(key)
+    if cached is not None:
+        return cached.copy(deep=False)
+    df = _build_summary_df_sql_uncached(opts)
+    with _SUMMARY_CACHE_LOCK:
+        _SUMMARY_CACHE[key] = df
+    return df.copy(deep=False)
+
+
+def _build_summary_df_sql_uncached(opts: ReportOptions) -> pd.DataFrame:
+    wprod = func.sum(Product.qty * Product.price)
     with get_session() as s:
-        q = s.query(Product)
+        q = s.query(
+            Product.dept_id,
+            func.count(func.distinct(Product.article)),
+            func.sum(Product.qty),
+            wprod,
+            func.avg(Product.price),
+        )
         if opts.dept_id:
             q = q.filter(Product.dept_id == str(opts.dept_id))
         if not opts.include_inactive:
-            q = q.filter(Product.active == True)  # noqa: E712
-        products = q.all()  # type: ignore
-    return _df_unique_articles(products)
+            q = q.filter(Product.active.is_(True))
+        rows = q.group_by(Product.dept_id).order_by(Product.dept_id).all()  # type: ignore
 
-
-def build_summary_df(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Побудувати зведення по відділах на основі переліку товарів.
-    """
-    return _per_dept_summary(df)
+    if not rows:
+        return pd.DataFrame(columns=["відділ", "унікальних артикулів", "шт (∑)", "сума (∑)", "середня ціна"])
+    dept, uniq, qty, summ, pmean = zip(*rows)
+    qsum = np.nan_to_num(np.asarray(qty, dtype=np.float64))
+    wsum = np.nan_to_num(np.asarray(summ, dtype=np.float64))
+    avg = np.where(qsum > 0, wsum / np.where(qsum > 0, qsum, 1.0), np.asarray(pmean, dtype=np.float64))
+    return pd.DataFrame({
+        "відділ": [str(x) for x in dept],
+        "унікальних артикулів": np.asarray(uniq, dtype=np.int64),
+        "шт (∑)": qsum,
+        "сума (∑)": wsum,
+        "середня ціна": np.nan_to_num(avg),
+    })
 
 
 def export_report(opts: ReportOptions) -> Path:
@@ -206,22 +313,36 @@ def export_report(opts: ReportOptions) -> Path:
     Побудувати звіт і записати його у файл у каталозі exports/.
     Повертає шлях до створеного файла.
     """
-    df = build_products_df(opts)
-    summary = build_summary_df(df)
+    # Зведення рахує БД; повний перелік тягнемо лише якщо зведення порожнє
+    summary = build_summary_df_sql(opts)
 
     # Якщо конкретний відділ — робимо один аркуш
     # Якщо всі відділи — можемо записати два аркуші: "Перелік", "Зведення"
     path = _report_filename(opts.kind, opts.dept_id or None, opts.fmt)
 
-    if opts.fmt.lower() in ("xlsx", "ods"):
+    # Якщо summary не пусте, пишемо саме summary. Інакше — повний перелік.
+    df_to_write = summary if not summary.empty else build_products_df(opts)
+
+    fmt = _ensure_ext(opts.fmt)
+    if fmt in ("parquet", "feather"):
+        # Колонкові формати потребують pyarrow (не входить у requirements.txt)
+        try:
+            if fmt == "parquet":
+                df_to_write.to_parquet(path, compression="zstd", index=False)
+            else:
+                df_to_write.reset_index(drop=True).to_feather(path, compression="zstd")
+        except ImportError as exc:
+            raise RuntimeError(
+                f"Експорт у .{fmt} потребує опційної залежності 'pyarrow'."
+            ) from exc
+    elif fmt in ("xlsx", "ods"):
         # Для простоти збережемо лише один аркуш. Якщо потрібно — можна зробити мульти-аркуші.
-        # Тепер: якщо summary не пусте, пишемо саме summary. Інакше — повний перелік.
-        df_to_write = summary if not summary.empty else df
-        write_table(df_to_write, path, fmt=opts.fmt, sheet_name=opts.sheet_name, index=False)
+        write_table(df_to_write, path, fmt=fmt, sheet_name=opts.sheet_name, index=False)
     else:
-        # CSV — тільки один набір даних
-        df_to_write = summary if not summary.empty else df
-        write_table(df_to_write, path, fmt="csv", index=False)
+        # CSV — тільки один набір даних; пишемо пачками, щоб не тримати весь текст у пам'яті
+        df_to_write.iloc[:0].to_csv(path, index=False)
+        for start in range(0, len(df_to_write), EXPORTS_CSV_CHUNK):
+            df_to_write.iloc[start:start + EXPORTS_CSV_CHUNK].to_csv(path, mode="a", header=False, index=False)
 
     # Ретеншн
     _cleanup_old_exports()
@@ -264,7 +385,14 @@ async def _run_and_send_report(message: types.Message, kind: str, dept_tag: str,
     opts = ReportOptions(dept_id=dept, include_inactive=False, fmt=fmt, kind=kind,
                          sheet_name="Звіт")
     path = export_report(opts)
-    await message.answer_document(types.InputFile(str(path)), caption=f"Звіт «{kind}», відділ: {dept or 'усі'}")
+    # Читаємо файл асинхронно і відправляємо з пам'яті; великі — потоково з диска
+    if path.stat().st_size <= SEND_IN_MEMORY_MAX_BYTES:
+        async with aiofiles.open(path, "rb") as f:
+            data = await f.read()
+        document = types.BufferedInputFile(data, filename=path.name)
+    else:
+        document = types.FSInputFile(path, filename=path.name)
+    await message.answer_document(document, caption=f"Звіт «{kind}», відділ: {dept or 'усі'}")
 
 
 async def cb_report_menu(cb: types.CallbackQuery):
@@ -272,9 +400,9 @@ async def cb_report_menu(cb: types.CallbackQuery):
     Обробка натискань на кнопки звітів.
     Формат callback_data: rep:<kind>:<dept|all>
     """
-    try:
-        _, kind, dept_tag = cb.data.split(":", 2)
-    except Exception:
+    _, _, rest = (cb.data or "").partition(":")
+    kind, sep, dept_tag = rest.partition(":")
+    if not sep:
         await cb.answer("Невірний запит", show_alert=True)
         return
 
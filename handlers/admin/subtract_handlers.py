@@ -9,7 +9,7 @@
      2) "назва..." де на початку є 8 цифр  → напр. "12345678 Носки чорні L, 2"
  - Кожен рядок окремо, порожні і коментарні (# ...) ігноруються.
  - Для кожної позиції:
-     - Блокує товар у БД (SELECT ... FOR UPDATE SKIP LOCKED)
+     - Блокує товар у БД (SELECT ... FOR UPDATE; зайнятий рядок чекаємо, а не пропускаємо)
      - Зменшує qty на запитану кількість, але не нижче 0
      - Пише підсумковий звіт (скільки було, скільки знято, скільки стало)
  - Інвалідує кеш карток для зачеплених товарів (ProductCardCache).
@@ -36,7 +36,7 @@ from aiogram import types, Dispatcher, F
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from dotenv import load_dotenv
-from sqlalchemy import and_, text
+from sqlalchemy import Float, String, and_, column, func, select, tuple_, update, values
 
 # ORM та сесії
 from database.orm.products import Product, ProductCardCache  # type: ignore
@@ -64,14 +64,25 @@ SUBTRACT_ALLOWED_ROLES = os.getenv("SUBTRACT_ALLOWED_ROLES", "admin,manager")
 DEPT_DEFAULT = os.getenv("DEPT_DEFAULT", "").strip() or None
 
 # Проста перевірка прав. У тебе може бути більш складна рольова модель.
-ADMIN_IDS = set(int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x.strip().isdigit())
-MANAGER_IDS = set(int(x) for x in os.getenv("MANAGER_IDS", "").replace(" ", "").split(",") if x.strip().isdigit())
+ADMIN_IDS = frozenset(int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x.strip().isdigit())
+MANAGER_IDS = frozenset(int(x) for x in os.getenv("MANAGER_IDS", "").replace(" ", "").split(",") if x.strip().isdigit())
 
 
 # ------------------------------ Парсинг вводу --------------------------------
 
 ARTICLE_RE = re.compile(r"^\s*(\d{8})\b")  # 8 цифр на початку
-LINE_SPLIT_RE = re.compile(r"[\r\n]+")
+# Уся граматика списання одним виразом по всьому тексту: [dept:]артикул [назва], кількість.
+# Коментарні рядки (# ...) відсікає негативний lookahead; [ \t] — щоб не перескакувати рядки.
+# Відділ — будь-який код без ":", "," і пробілів (dept_id — String(32)), навколо ":" можна
+# ставити пробіли. Без відділу ":" у першій частині рядка не допускається (як у старому
+# построковому розборі). Кількість — усе, що приймає float(), з комою або крапкою.
+_PAYLOAD_RE = re.compile(
+    r"^(?![ \t]*#)[ \t]*"
+    r"(?:(?P<dept>[^:,\s]+)[ \t]*:[ \t]*(?P<art>\d{8})\b[^,\n]*"
+    r"|(?P<art_plain>\d{8})\b[^,:\n]*)"
+    r",[ \t]*(?P<qty>[-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][-+]?\d+)?)[ \t\r]*$",
+    re.MULTILINE,
+)
 
 
 @dataclass
@@ -91,56 +102,22 @@ def _extract_article(text: str) -> Optional[str]:
     return m.group(1)
 
 
-def _parse_line(line: str, default_dept: Optional[str]) -> Optional[SubtractItem]:
+def parse_subtract_payload(text: str, default_dept: Optional[str]) -> List[SubtractItem]:
     """
-    Парсити один рядок.
-    Підтримувані формати:
+    Розпарсити весь текст на позиції списання одним проходом регулярного виразу.
+    Підтримувані формати рядків:
         "12345678, 3"
         "12345678 назва, 2"
         "100:12345678, 5"   (якщо хочеш явно вказати відділ у рядку: dept:article, qty)
+    Порожні, коментарні, без коми та з кількістю <= 0 — ігноруються.
     """
-    s = line.strip()
-    if not s or s.startswith("#"):
-        return None
-
-    # Варіант з явним відділом: 100:12345678, 5
-    if ":" in s.split(",")[0]:
-        head, *rest = s.split(",", 1)
-        qty_str = rest[0] if rest else ""
-        try:
-            dept_part, art_part = head.split(":", 1)
-            dept = dept_part.strip()
-            art = _extract_article(art_part.strip())
-            qty = float(qty_str.strip().replace(",", "."))
-            if not art or qty <= 0:
-                return None
-            return SubtractItem(article=art, qty=qty, dept_id=dept)
-        except Exception:
-            return None
-
-    # Звичайний варіант: "артикул, qty" або "артикул назва, qty"
-    if "," in s:
-        left, qty_str = s.split(",", 1)
-        art = _extract_article(left)
-        try:
-            qty = float(qty_str.strip().replace(",", "."))
-        except Exception:
-            return None
-        if not art or qty <= 0:
-            return None
-        return SubtractItem(article=art, qty=qty, dept_id=default_dept)
-
-    # Без коми не приймаємо (щоб уникати неоднозначностей)
-    return None
-
-
-def parse_subtract_payload(text: str, default_dept: Optional[str]) -> List[SubtractItem]:
-    """Розпарсити весь текст на позиції списання."""
     items: List[SubtractItem] = []
-    for line in LINE_SPLIT_RE.split(text or ""):
-        it = _parse_line(line, default_dept)
-        if it:
-            items.append(it)
+    for m in _PAYLOAD_RE.finditer(text or ""):
+        qty = float(m["qty"].replace(",", "."))
+        if qty > 0:
+            items.append(SubtractItem(
+                article=m["art"] or m["art_plain"], qty=qty, dept_id=m["dept"] or default_dept,
+            ))
     return items
 
 
@@ -157,50 +134,46 @@ def _is_allowed(user: types.User) -> bool:
 
 # ------------------------------ База/транзакції -------------------------------
 
-def _invalidate_card_cache(session, dept_id: str, article: str) -> None:
-    """Видалити кеш картки для вказаного товару (L2)."""
-    session.query(ProductCardCache).filter(
-        ProductCardCache.dept_id == str(dept_id),
-        ProductCardCache.article == str(article),
-    ).delete(synchronize_session=False)
-
-
-def _subtract_one(session, dept_id: str, article: str, qty: float) -> Tuple[float, float]:
-    """
-    Списати qty з продукту (але не нижче 0).
-    Повертає (було, стало).
-    Блокує рядок на час транзакції.
+def _subtract_many(session, agg: Dict[Tuple[str, str], float]) -> Dict[Tuple[str, str], Tuple[float, float]]:
     """
-    # Явний блок рядка. SQLAlchemy Core текстом, щоб не залежати від діалекту.
-    lock_sql = text(
-        """
-        SELECT id FROM products
-        WHERE dept_id = :dept_id AND article = :article
-        FOR UPDATE SKIP LOCKED
+    Пакетне списання одним запитом: CTE блокує всі (відділ, артикул) з VALUES
+    (FOR UPDATE — як і в _apply_add, рядок, зайнятий паралельним додаванням чи
+    списанням, чекаємо) і запам'ятовує старе qty, UPDATE ... FROM робить
+    клемп greatest(qty - q, 0) у БД; далі одне видалення кешу карток.
+    Повертає {(відділ, артикул): (було, стало)}; відсутніх ключів у результаті немає.
     """
+    if not agg:
+        return {}
+
+    v = values(
+        column("dept_id", String), column("article", String), column("q", Float), name="v",
+    ).data([(d, a, float(q)) for (d, a), q in agg.items()])
+    locked = (
+        select(Product.id, Product.qty.label("old_qty"), v.c.q)
+        .join(v, and_(Product.dept_id == v.c.dept_id, Product.article == v.c.article))
+        .order_by(Product.id)  # однаковий порядок блокувань — без взаємних deadlock між пачками
+        .with_for_update(of=Product)
+        .cte("locked")
     )
-    session.execute(lock_sql, {"dept_id": str(dept_id), "article": str(article)})
-
-    # Отримати продукт
-    prod = (
-        session.query(Product)
-        .filter(and_(Product.dept_id == str(dept_id), Product.article == str(article)))
-        .one_or_none()
-    )
-
-    if not prod:
-        raise ValueError("Товар не знайдено")
+    rows = session.execute(
+        update(Product)
+        .where(Product.id == locked.c.id)
+        .values(qty=func.greatest(Product.qty - locked.c.q, 0.0))
+        .returning(Product.dept_id, Product.article, locked.c.old_qty, Product.qty)
+    ).all()
 
-    before = float(prod.qty or 0.0)
-    new_qty = before - float(qty)
-    if new_qty < 0:
-        new_qty = 0.0
+    done: Dict[Tuple[str, str], Tuple[float, float]] = {
+        (str(d), str(a)): (float(before or 0.0), float(after or 0.0))
+        for d, a, before, after in rows
+    }
 
-    prod.qty = new_qty
-    # Інвалідація кешу картки
-    _invalidate_card_cache(session, dept_id, article)
+    # Інвалідація кешу карток — одним DELETE
+    if done:
+        session.query(ProductCardCache).filter(
+            tuple_(ProductCardCache.dept_id, ProductCardCache.article).in_(list(done.keys()))
+        ).delete(synchronize_session=False)
 
-    return before, new_qty
+    return done
 
 
 # ------------------------------ Хендлери TG -----------------------------------
@@ -275,15 +248,14 @@ async def handle_subtract_payload(message: types.Message):
     # Транзакційно списуємо
     try:
         with get_session() as s:
-            for (dept, art), qty in agg.items():
-                try:
-                    before, after = _subtract_one(s, dept, art, qty)
-                    results.append(f"• {dept}:{art}: {before:.2f} − {qty:.2f} → <b>{after:.2f}</b>")
-                except ValueError:
-                    errors.append(f"• {dept}:{art}: товар не знайдено")
-                except Exception:
-                    errors.append(f"• {dept}:{art}: помилка списання")
+            done = _subtract_many(s, agg)
             s.commit()
+        for (dept, art), qty in agg.items():
+            if (dept, art) in done:
+                before, after = done[(dept, art)]
+                results.append(f"• {dept}:{art}: {before:.2f} − {qty:.2f} → <b>{after:.2f}</b>")
+            else:
+                errors.append(f"• {dept}:{art}: товар не знайдено")
     except Exception:
         # якщо щось критичне поза циклом
         errors.append(
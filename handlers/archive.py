@@ -38,7 +38,8 @@ async def show_archive_handler(callback: CallbackQuery, state: FSMContext):
         for i, lst in enumerate(archived_lists, 1):
             created_date = lst.created_at.strftime("%d.%m.%Y о %H:%M")
             response_text.append(
-                LEXICON.ARCHIVE_ITEM.format(
+                LEXICON.render(
+                    "ARCHIVE_ITEM",
                     i=i, 
                     file_name=lst.file_name, 
                     created_date=created_date
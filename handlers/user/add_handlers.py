@@ -26,7 +26,8 @@ from aiogram import types, Dispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ForceReply
-from sqlalchemy import and_, text
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from database.session import get_session  # type: ignore
 from database.orm.products import Product, PicklistItem, PicklistOverflowItem  # type: ignore
@@ -41,61 +42,66 @@ class AddQtyForm(StatesGroup):
 
 # ----------------------------- База/транзакції --------------------------------
 
+# Надлишок, менший за цей поріг, — похибка float, а не реальна нестача
+_QTY_EPS = 1e-9
+
+
 async def _apply_add(user_id: str, dept_id: str, article: str, req_qty: float) -> Tuple[float, float]:
     """
     Алокація + надлишки. Повертає (alloc, overflow).
     """
+    u, d, a = str(user_id), str(dept_id), str(article)
+    req = max(0.0, float(req_qty))
     alloc = overflow = 0.0
     with get_session() as s:
-        # блокування продукту рядком
-        s.execute(text("""
-            SELECT id FROM products
-            WHERE dept_id = :dept AND article = :art
-            FOR UPDATE SKIP LOCKED
-        """), {"dept": str(dept_id), "art": str(article)})
-
-        prod = s.query(Product).filter(
-            and_(Product.dept_id == str(dept_id), Product.article == str(article))
-        ).one_or_none()
-
-        if not prod:
+
+        # Блокування + алокація одним запитом: qty -= LEAST(qty, req).
+        # CTE чекає на блокування рядка (без SKIP LOCKED — інакше зайнятий іншим
+        # додаванням/списанням товар пішов би цілком у надлишки) і бачить актуальне qty.
+        old = (
+            select(Product.id, Product.qty.label("old_qty"))
+            .where(Product.dept_id == d, Product.article == a)
+            .with_for_update()
+            .cte("old")
+        )
+        row = s.execute(
+            update(Product)
+            .where(Product.id == old.c.id)
+            .values(qty=Product.qty - func.least(Product.qty, req))
+            .returning(func.least(old.c.old_qty, req))
+        ).first()
+
+        if not row:
             s.commit()
             return 0.0, req_qty  # товар відсутній у довіднику
 
-        available = float(prod.qty or 0.0)
-        req = max(0.0, float(req_qty))
-
-        alloc = min(available, req)
-        overflow = max(req - alloc, 0.0)
-
-        # оновлення products
-        prod.qty = available - alloc
-
-        # upsert PicklistItem
-        pi = s.query(PicklistItem).filter(
-            and_(PicklistItem.user_id == str(user_id),
-                 PicklistItem.dept_id == str(dept_id),
-                 PicklistItem.article == str(article))
-        ).one_or_none()
-        if not pi:
-            pi = PicklistItem(user_id=str(user_id), dept_id=str(dept_id), article=str(article), qty_alloc=0.0)
-            s.add(pi)
-        pi.qty_alloc = float(pi.qty_alloc or 0.0) + alloc
+        # alloc = LEAST(old, req) з БД — без віднімання old - new у float
+        alloc = max(float(row[0] or 0.0), 0.0)
+        overflow = req - alloc
+        if overflow < _QTY_EPS:
+            overflow = 0.0
+
+        # upsert PicklistItem — INSERT ... ON CONFLICT (user_id, dept_id, article)
+        ins = pg_insert(PicklistItem).values(
+            user_id=u, dept_id=d, article=a, qty_alloc=alloc,
+        )
+        s.execute(ins.on_conflict_do_update(
+            index_elements=["user_id", "dept_id", "article"],
+            set_={"qty_alloc": PicklistItem.__table__.c.qty_alloc + alloc, "updated_at": func.now()},
+        ))
 
         # upsert PicklistOverflowItem
         if overflow > 0:
-            po = s.query(PicklistOverflowItem).filter(
-                and_(PicklistOverflowItem.user_id == str(user_id),
-                     PicklistOverflowItem.dept_id == str(dept_id),
-                     PicklistOverflowItem.article == str(article))
-            ).one_or_none()
-            if not po:
-                po = PicklistOverflowItem(user_id=str(user_id), dept_id=str(dept_id), article=str(article), qty_overflow=0.0)
-                s.add(po)
-            po.qty_overflow = float(po.qty_overflow or 0.0) + overflow
+            ins = pg_insert(PicklistOverflowItem).values(
+                user_id=u, dept_id=d, article=a, qty_overflow=overflow,
+            )
+            s.execute(ins.on_conflict_do_update(
+                index_elements=["user_id", "dept_id", "article"],
+                set_={"qty_overflow": PicklistOverflowItem.__table__.c.qty_overflow + overflow, "updated_at": func.now()},
+            ))
 
         # інвалідувати кеш картки
-        invalidate(s, dept_id, article)
+        invalidate(s, d, a)
 
         s.commit()
     return alloc, overflow
@@ -9,26 +9,33 @@ from __future__ import annotations
 
 from aiogram import types, Dispatcher  # Dispatcher imported from aiogram root for v3
 
-from database.session import get_session  # type: ignore
-from utils.card_cache import get_or_render_card
+from utils.card_cache import aget_or_render_card
 from utils.renderers import render_product_card
 from utils.kb_guard import safe_edit_or_send, require_kb
 from keyboards.inline import get_cached_product_kb
 
 
+# Шаблон картки компілюється один раз; необов'язкові рядки підставляються готовими
+_CARD_TEMPLATE = (
+    "<b>{title}</b>{subtitle_line}\n"
+    "📦 Доступно: <b>{available:.2f}</b>\n"
+    "💵 Ціна: <b>{price:.2f}</b>{note_line}"
+)
+
+
 def _render_text(card: dict) -> str:
     """
     Побудувати текст картки для Telegram.
     """
-    lines = []
-    lines.append(f"<b>{card.get('title') or ''}</b>")
-    if card.get("subtitle"):
-        lines.append(card["subtitle"])
-    lines.append(f"📦 Доступно: <b>{card.get('available', 0):.2f}</b>")
-    lines.append(f"💵 Ціна: <b>{card.get('price', 0):.2f}</b>")
-    if card.get("note"):
-        lines.append(f"ℹ️ {card['note']}")
-    return "\n".join(lines)
+    subtitle = card.get("subtitle")
+    note = card.get("note")
+    return _CARD_TEMPLATE.format_map({
+        "title": card.get("title") or "",
+        "subtitle_line": f"\n{subtitle}" if subtitle else "",
+        "available": card.get("available", 0),
+        "price": card.get("price", 0),
+        "note_line": f"\nℹ️ {note}" if note else "",
+    })
 
 
 @require_kb
@@ -43,10 +50,11 @@ async def open_product(cb: types.CallbackQuery):
         await cb.answer("Помилка запиту", show_alert=True)
         return
 
-    with get_session() as s:
-        payload = get_or_render_card(s, dept_id, article, render_product_card)
+    # Холодна картка рендериться один раз навіть при паралельних кліках (single-flight)
+    payload = await aget_or_render_card(dept_id, article, render_product_card, text_renderer=_render_text)
 
-    text = _render_text(payload)
+    # Текст рендериться один раз при заповненні кешу; старі записи без нього — на льоту
+    text = payload.get("_rendered_html") or _render_text(payload)
     kb = get_cached_product_kb(payload["dept_id"], payload["article"], payload.get("can_add", False))
 
     file_id = payload.get("file_id")
@@ -39,7 +39,7 @@ async def _add_item_logic(user_id: int, product_id: int, quantity: int, bot: Bot
 
             allowed_department = await orm_get_temp_list_department(user_id)
             if allowed_department is not None and product.відділ != allowed_department:
-                error_msg = LEXICON.DEPARTMENT_MISMATCH.format(department=allowed_department)
+                error_msg = LEXICON.render("DEPARTMENT_MISMATCH", department=allowed_department)
                 if callback.id == "fake_callback":
                     # Для ручного вводу краще надіслати повідомлення, а не спливаюче вікно
                     await bot.send_message(callback.message.chat.id, error_msg)
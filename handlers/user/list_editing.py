@@ -86,7 +86,7 @@ async def edit_item_handler(callback: CallbackQuery, state: FSMContext, bot: Bot
         ]])
         
         await bot.edit_message_text(
-            text=LEXICON.EDIT_ITEM_QUANTITY_PROMPT.format(product_name=product.назва),
+            text=LEXICON.render("EDIT_ITEM_QUANTITY_PROMPT", product_name=product.назва),
             chat_id=callback.message.chat.id,
             message_id=callback.message.message_id,
             reply_markup=cancel_kb,
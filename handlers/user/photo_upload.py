@@ -7,7 +7,8 @@
 - Бот:
     1) Витягує найбільше фото з повідомлення.
     2) Завантажує байти, оптимізує (JPEG 1280/512).
-    3) Рахує геші (aHash + sha256) і робить дедуплікацію.
+    3) Рахує геші (pHash + aHash + sha256) і робить дедуплікацію
+       за відстанню Геммінга між pHash (<= PHASH_MAX_DISTANCE біт).
     4) Зберігає оптимізовані файли у локальне сховище (utils.storage).
     5) Пише запис у ProductPhoto зі status="pending".
 - Відповідь: підтвердження про надсилання на модерацію.
@@ -19,14 +20,14 @@
 Залежності:
     aiogram 3.x
     utils.image_opt.optimize_for_telegram
-    utils.storage.save_bytes
+    utils.storage.asave_bytes
     database.orm.products.ProductPhoto
 """
 
 from __future__ import annotations
 
+import asyncio
 import io
-import re
 from typing import Optional
 
 from aiogram import Router
@@ -35,12 +36,41 @@ from aiogram.types import Message, ContentType
 
 from database.session import get_session  # type: ignore
 from database.orm.products import ProductPhoto  # type: ignore
-from utils.image_opt import optimize_for_telegram
-from utils.storage import save_bytes
+from sqlalchemy import cast, func, or_, select
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.exc import DBAPIError
+
+from utils.image_opt import hash_to_int64, optimize_for_telegram_async
+from utils.storage import asave_bytes
 
 router = Router(name="photo_upload")
 
-CAPTION_RE = re.compile(r"^\s*(?P<dept>[A-Za-z0-9_\-\.]+)\s*:\s*(?P<art>[A-Za-z0-9_\-\.]+)\s*$")
+# Скільки бітів pHash може відрізнятися, щоб фото вважалося дублем
+PHASH_MAX_DISTANCE = 4
+
+_MASK64 = (1 << 64) - 1
+
+# Дозволені символи у відділі/артикулі підпису: ASCII-літери/цифри та "_-."
+_CAPTION_EXTRA = frozenset("_-.")
+
+
+def _is_caption_token(s: str) -> bool:
+    return bool(s) and s.isascii() and all(c.isalnum() or c in _CAPTION_EXTRA for c in s)
+
+
+def parse_caption(caption: str) -> Optional[tuple[str, str]]:
+    """
+    Розібрати підпис "dept:article" → (dept, article) або None.
+    partition + перевірка символів замість regex: більшість підписів не збігаються
+    і відсікаються вже на пошуку ':'.
+    """
+    left, sep, right = caption.partition(":")
+    if not sep:
+        return None
+    dept, art = left.strip(), right.strip()
+    if not (_is_caption_token(dept) and _is_caption_token(art)):
+        return None
+    return dept, art
 
 
 def _pick_largest_photo(msg: Message):
@@ -52,17 +82,14 @@ def _pick_largest_photo(msg: Message):
     return max(msg.photo, key=lambda p: (p.width or 0) * (p.height or 0))
 
 
-async def _download_bytes(msg: Message) -> Optional[bytes]:
+async def _download_bytes(bot, photo) -> Optional[bytes]:
     """
-    Завантажити байти найбільшого фото з повідомлення.
+    Завантажити байти вже вибраного PhotoSize.
     aiogram 3.x: Bot.download(file, destination).
     """
-    ph = _pick_largest_photo(msg)
-    if not ph:
-        return None
     buf = io.BytesIO()
     # універсальний спосіб: aiogram 3.x має generic download
-    await msg.bot.download(ph, buf)
+    await bot.download(photo, buf)
     return buf.getvalue()
 
 
@@ -86,20 +113,25 @@ async def handle_photo_upload(message: Message):
     Основний обробник: приймає фото, читає підпис, зберігає, створює запис у БД.
     """
     caption = (message.caption or "").strip()
-    m = CAPTION_RE.match(caption)
-    if not m:
+    parsed = parse_caption(caption)
+    if parsed is None:
         await message.reply(
             "Не впізнав підпис. Використайте формат <code>відділ:артикул</code>, напр. <code>100:12345678</code>.",
             parse_mode="HTML"
         )
         return
 
-    dept_id = m.group("dept")
-    article = m.group("art")
+    dept_id, article = parsed
+
+    # Найбільший варіант фото вибираємо один раз: і для завантаження, і для file_id
+    largest = _pick_largest_photo(message)
+    if largest is None:
+        await message.reply("Не вдалося завантажити фото. Спробуйте ще раз.")
+        return
 
     # 1) Завантажити байти
     try:
-        raw_bytes = await _download_bytes(message)
+        raw_bytes = await _download_bytes(message.bot, largest)
         if not raw_bytes:
             await message.reply("Не вдалося завантажити фото. Спробуйте ще раз.")
             return
@@ -107,56 +139,82 @@ async def handle_photo_upload(message: Message):
         await message.reply("Сталася помилка під час завантаження фото. Спробуйте ще раз.")
         return
 
-    # 2) Оптимізувати
+    # 2) Оптимізувати (CPU-bound: декод/ресайз/DCT/sha256 — у пулі процесів, поза event loop)
     try:
-        opt = optimize_for_telegram(raw_bytes)
+        opt = await optimize_for_telegram_async(raw_bytes)
         main_bytes = opt["bytes_main"]
         thumb_bytes = opt["bytes_thumb"]
         ahash = opt["ahash"]
+        phash_int = opt["phash_int"]
         sha_main = opt["sha256_main"]
     except Exception:
         await message.reply("Не вдалося обробити фото. Перевірте файл і спробуйте ще раз.")
         return
 
-    # 3) Дедуплікація: перевіримо image_hash (aHash) у БД
+    # 3) Дедуплікація: pHash зберігається як BIGINT, відстань Геммінга рахує БД
+    #    (bit_count(a # b), PostgreSQL 14+). Точний збіг з aHash — для старих записів.
+    ahash_int = hash_to_int64(ahash)
     with get_session() as s:
-        exists = s.query(ProductPhoto).filter(
-            ProductPhoto.dept_id == str(dept_id),
-            ProductPhoto.article == str(article),
-            ProductPhoto.image_hash == str(ahash)
-        ).one_or_none()
+        try:
+            exists = s.execute(
+                select(ProductPhoto.id).where(
+                    ProductPhoto.dept_id == str(dept_id),
+                    ProductPhoto.article == str(article),
+                    or_(
+                        ProductPhoto.image_hash == ahash_int,
+                        func.bit_count(cast(ProductPhoto.image_hash.op("#")(phash_int), BIT(64))) <= PHASH_MAX_DISTANCE,
+                    ),
+                ).limit(1)
+            ).scalar() is not None
+        except DBAPIError:
+            # Бекенд без bit_count — рахуємо в Python (int.bit_count, один POPCNT на пару)
+            s.rollback()
+            known = s.scalars(
+                select(ProductPhoto.image_hash).where(
+                    ProductPhoto.dept_id == str(dept_id),
+                    ProductPhoto.article == str(article),
+                    ProductPhoto.image_hash.is_not(None),
+                )
+            )
+            exists = any(
+                h == ahash_int or ((h ^ phash_int) & _MASK64).bit_count() <= PHASH_MAX_DISTANCE
+                for h in known
+            )
         if exists:
             await message.reply("Таке фото вже було надіслане раніше. Дякуємо.")
             return
 
         # 4) Збереження файлів у локальне сховище (не обов'язково тримати шлях у БД)
-        stored_main = save_bytes(
-            main_bytes,
-            category="photos",
-            dept_id=str(dept_id),
-            article=str(article),
-            ext_hint="jpg",
-            prefix="main"
-        )
-        stored_thumb = save_bytes(
-            thumb_bytes,
-            category="photos",
-            dept_id=str(dept_id),
-            article=str(article),
-            ext_hint="jpg",
-            prefix="thumb"
+        #    Запис на диск — у thread-пулі, обидва файли паралельно
+        stored_main, stored_thumb = await asyncio.gather(
+            asave_bytes(
+                main_bytes,
+                category="photos",
+                dept_id=str(dept_id),
+                article=str(article),
+                ext_hint="jpg",
+                prefix="main",
+                sha256=sha_main,
+            ),
+            asave_bytes(
+                thumb_bytes,
+                category="photos",
+                dept_id=str(dept_id),
+                article=str(article),
+                ext_hint="jpg",
+                prefix="thumb",
+            ),
         )
 
         # 5) Запис у БД: статус pending, file_id беремо з Telegram-фото користувача
         #     Беремо file_id найбільшого фото (працює стабільно для повторних відправлень Telegram)
-        largest = _pick_largest_photo(message)
-        file_id = largest.file_id if largest else None
+        file_id = largest.file_id
 
         photo = ProductPhoto(
             dept_id=str(dept_id),
             article=str(article),
             file_id=file_id,
-            image_hash=str(ahash),
+            image_hash=phash_int,
             status="pending",
             order_no=1,  # адмін зможе поміняти порядок
         )
@@ -16,8 +16,12 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
+from typing import Optional, Tuple
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
+from sqlalchemy import select
 
 from database.session import get_session  # type: ignore
 from database.orm.products import Product  # type: ignore
@@ -28,6 +32,39 @@ from handlers.user.card_handlers import open_product
 router = Router(name="product_bridge")
 
 
+# ------------------------- id → (dept_id, article) ---------------------------
+# Ключ товару за id не змінюється (UPSERT імпорту оновлює рядок на місці),
+# тож знайдені пари кешуються в пам'яті процесу.
+
+class _ProductNotFound(LookupError):
+    pass
+
+
+@lru_cache(maxsize=50_000)
+def _resolve_cached(pid: int) -> Tuple[str, str]:
+    with get_session() as s:
+        row = s.execute(
+            select(Product.dept_id, Product.article).where(Product.id == pid)
+        ).one_or_none()
+    if row is None:
+        # Виняток не кешується lru_cache: товар, якого ще немає, шукатимемо знову
+        raise _ProductNotFound(pid)
+    return str(row.dept_id), str(row.article)
+
+
+def resolve_product_key(pid: int) -> Optional[Tuple[str, str]]:
+    """(dept_id, article) товару за id або None, якщо такого немає."""
+    try:
+        return _resolve_cached(pid)
+    except _ProductNotFound:
+        return None
+
+
+def clear_product_key_cache() -> None:
+    """Скинути кеш id → (dept_id, article), напр. після імпорту довідника."""
+    _resolve_cached.cache_clear()
+
+
 @router.callback_query(F.data.startswith("product:"))
 async def product_legacy_to_cached(cb: CallbackQuery):
     """
@@ -40,14 +77,13 @@ async def product_legacy_to_cached(cb: CallbackQuery):
         await cb.answer("Невірний ідентифікатор товару", show_alert=True)
         return
 
-    # Знайти товар у БД
-    with get_session() as s:
-        row = s.query(Product).filter(Product.id == pid).one_or_none()
+    # Знайти товар (кеш у пам'яті, на промаху — БД)
+    key = resolve_product_key(pid)
 
-    if not row:
+    if key is None:
         await cb.answer("Товар не знайдено. Можливо, його вже видалено з довідника.", show_alert=True)
         return
 
     # Переформуємо callback і делегуємо в існуючий обробник відкриття картки
-    cb.data = f"open:{row.dept_id}:{row.article}"
+    cb.data = f"open:{key[0]}:{key[1]}"
     await open_product(cb)
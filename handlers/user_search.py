@@ -1,5 +1,6 @@
 # epicservice/handlers/user_search.py
 
+import asyncio
 import logging
 
 from aiogram import Bot, F, Router
@@ -10,12 +11,14 @@ from aiogram.types import CallbackQuery, Message
 from sqlalchemy.exc import SQLAlchemyError
 
 from database.engine import async_session
+from database.session import get_session
 from database.orm import orm_find_products, orm_get_product_by_id
 from handlers.common import clean_previous_keyboard
 # --- ЗМІНА: Імпортуємо back_to_main_menu для коректної навігації ---
 from handlers.user.list_management import back_to_main_menu
 from keyboards.inline import get_search_results_kb
 from lexicon.lexicon import LEXICON
+from utils.card_cache import prefetch_cards
 from utils.card_generator import send_or_edit_product_card
 
 logger = logging.getLogger(__name__)
@@ -25,6 +28,15 @@ class SearchStates(StatesGroup):
     showing_results = State()
 
 
+def _prefetch_result_cards(pairs: list[tuple[str, str]]) -> None:
+    """Одним запитом прогріти L1-кеш карток зі списку результатів."""
+    try:
+        with get_session() as s:
+            prefetch_cards(s, pairs)
+    except SQLAlchemyError as e:
+        logger.warning("Не вдалося попередньо завантажити картки: %s", e)
+
+
 @router.message(F.text)
 async def search_handler(message: Message, bot: Bot, state: FSMContext):
     """
@@ -77,6 +89,10 @@ async def search_handler(message: Message, bot: Bot, state: FSMContext):
                 reply_markup=get_search_results_kb(products)
             )
             await state.update_data(main_message_id=sent_message.message_id)
+            # Поки користувач обирає товар — підтягуємо їхні картки в L1
+            await asyncio.to_thread(
+                _prefetch_result_cards, [(p.dept_id, p.article) for p in products]
+            )
             
     except SQLAlchemyError as e:
         logger.error("Помилка пошуку товарів для запиту '%s': %s", search_query, e)
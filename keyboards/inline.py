@@ -16,6 +16,8 @@ Inline keyboard builders for the Epic Service bot.
 під час пошуку.
 """
 
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from database.models import Product, TempList
@@ -91,8 +93,8 @@ def get_admin_panel_kb() -> InlineKeyboardMarkup:
 def get_users_with_archives_kb(users: list) -> InlineKeyboardMarkup:
     keyboard = []
     for user_id, lists_count in users:
-        button_text = LEXICON.BUTTON_USER_LIST_ITEM.format(
-            user_id=user_id, lists_count=lists_count
+        button_text = LEXICON.render(
+            "BUTTON_USER_LIST_ITEM", user_id=user_id, lists_count=lists_count
         )
         keyboard.append([
             InlineKeyboardButton(text=button_text, callback_data=f"admin:view_user:{user_id}")
@@ -141,10 +143,20 @@ def get_product_actions_kb(
     available_quantity: int,
     search_query: str | None = None
 ) -> InlineKeyboardMarkup:
+    """
+    Клавіатура дій з товаром. Від search_query залежить лише наявність кнопки
+    «Назад до результатів», тож кешуємо за (id, кількість, чи є запит).
+    Повертається спільний об'єкт — не мутувати.
+    """
+    return _product_actions_kb(product_id, available_quantity, bool(search_query))
+
+
+@lru_cache(maxsize=20_000)
+def _product_actions_kb(product_id: int, available_quantity: int, search_query: bool) -> InlineKeyboardMarkup:
     keyboard = []
     action_buttons = []
     if available_quantity > 0:
-        add_all_text = LEXICON.BUTTON_ADD_ALL.format(quantity=available_quantity)
+        add_all_text = LEXICON.render("BUTTON_ADD_ALL", quantity=available_quantity)
         action_buttons.append(
             InlineKeyboardButton(text=add_all_text, callback_data=f"add_all:{product_id}:{available_quantity}")
         )
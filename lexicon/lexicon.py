@@ -1,9 +1,20 @@
 # epicservice/lexicon/lexicon.py
 
+from string import Formatter
+
+
 class Lexicon:
     """
     Клас, що містить усі текстові константи (лексикон) для бота.
     """
+
+    def render(self, name: str, /, **fields) -> str:
+        """
+        Підставити поля в шаблон: LEXICON.render("ARCHIVE_ITEM", i=1, ...).
+        Шаблони заздалегідь скомпільовані у функції (див. _compile_template).
+        """
+        return _TEMPLATES[name](fields)
+
     # --- Загальні команди та привітання ---
     CMD_START_USER = "👋 Вітаю! Я допоможу вам знайти товари та створити списки. Оберіть дію:"
     CMD_START_ADMIN = "👑 Вітаю, Адміністраторе! Вам доступний розширений функціонал. Оберіть дію:"
@@ -190,4 +201,46 @@ class Lexicon:
         "Виникла непередбачена помилка. Ми вже отримали сповіщення і працюємо над її вирішенням. Спробуйте повторити дію пізніше."
     )
 
-LEXICON = Lexicon()
\ No newline at end of file
+_CONVERTERS = {"r": repr, "s": str, "a": ascii}
+
+
+def _compile_template(template: str):
+    """
+    Розібрати шаблон str.format один раз: літерали лишаються готовими шматками,
+    на місці полів — слоти, які заповнюються format(значення, spec) і
+    склеюються через "".join. Семантика як у format_map: відсутнє поле → KeyError,
+    зайві поля ігноруються. Поля складніші за {ім'я!conv:spec} — через format_map.
+    """
+    parts: list = []
+    slots: list = []
+    for literal, field, spec, conv in Formatter().parse(template):
+        if literal:
+            parts.append(literal)
+        if field is None:
+            continue
+        if not field.isidentifier() or "{" in (spec or ""):
+            return template.format_map
+        slots.append((len(parts), field, _CONVERTERS[conv] if conv else None, spec or ""))
+        parts.append("")
+    slots_t = tuple(slots)
+
+    def render(fields) -> str:
+        out = parts.copy()
+        for i, name, convert, spec in slots_t:
+            value = fields[name]
+            if convert is not None:
+                value = convert(value)
+            out[i] = format(value, spec)
+        return "".join(out)
+
+    return render
+
+
+# Шаблони з підстановками: ім'я → розібраний рендерер, зібрані один раз при імпорті
+_TEMPLATES = {
+    name: _compile_template(value)
+    for name, value in vars(Lexicon).items()
+    if isinstance(value, str) and "{" in value
+}
+
+LEXICON = Lexicon()
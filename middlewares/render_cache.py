@@ -0,0 +1,49 @@
+# epicservice/middlewares/render_cache.py
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import (
+    DeleteMessage,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+)
+from aiogram.methods.base import TelegramMethod, Response, TelegramType
+
+from utils.card_generator import forget_rendered_card
+from utils.kb_guard import forget_edited_message
+
+# Виклики API, що змінюють/видаляють наявне повідомлення
+_MUTATING_METHODS = (
+    EditMessageText,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    DeleteMessage,
+)
+
+
+class RenderCacheMiddleware(BaseRequestMiddleware):
+    """
+    Request-middleware сесії бота.
+
+    Будь-яке редагування чи видалення повідомлення скидає запам'ятований підпис
+    картки для (chat_id, message_id). Так send_or_edit_product_card і
+    safe_edit_or_send пропускають лише справді ідентичні повторні редагування:
+    якщо повідомлення тим часом змінив інший хендлер, наступне оновлення піде
+    в Telegram як завжди.
+    """
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, _MUTATING_METHODS):
+            chat_id = getattr(method, "chat_id", None)
+            message_id = getattr(method, "message_id", None)
+            if chat_id is not None and message_id is not None:
+                forget_rendered_card(chat_id, message_id)
+                forget_edited_message(chat_id, message_id)
+        return await make_request(bot, method)
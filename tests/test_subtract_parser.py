@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Регресія розбору «📉 Відняти зібране»: однопрохідний _PAYLOAD_RE має приймати
+рівно ті рядки, що й старий построковий _parse_line, і з тим самим результатом.
+"""
+
+import re
+from typing import Optional, Tuple
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("dotenv")
+
+from handlers.admin.subtract_handlers import parse_subtract_payload  # noqa: E402
+
+_ARTICLE_RE = re.compile(r"^\s*(\d{8})\b")
+
+
+def _baseline_article(text: str) -> Optional[str]:
+    m = _ARTICLE_RE.match(text)
+    return m.group(1) if m else None
+
+
+def _baseline_parse_line(line: str, default_dept: Optional[str]) -> Optional[Tuple[str, float, Optional[str]]]:
+    """Копія попереднього _parse_line — еталон для порівняння."""
+    s = line.strip()
+    if not s or s.startswith("#"):
+        return None
+    if ":" in s.split(",")[0]:
+        head, *rest = s.split(",", 1)
+        qty_str = rest[0] if rest else ""
+        try:
+            dept_part, art_part = head.split(":", 1)
+            art = _baseline_article(art_part.strip())
+            qty = float(qty_str.strip().replace(",", "."))
+            if not art or qty <= 0:
+                return None
+            return art, qty, dept_part.strip()
+        except Exception:
+            return None
+    if "," in s:
+        left, qty_str = s.split(",", 1)
+        art = _baseline_article(left)
+        try:
+            qty = float(qty_str.strip().replace(",", "."))
+        except Exception:
+            return None
+        if not art or qty <= 0:
+            return None
+        return art, qty, default_dept
+    return None
+
+
+LINES = [
+    "12345678, 3",
+    "12345678 Носки чорні L, 2",
+    "100:12345678, 5",
+    "100: 12345678, 5",
+    "100 : 12345678, 5",
+    "A1:12345678, 5",
+    "12345:12345678, 5",
+    "100:12345678 назва: x, 7",
+    "12345678, .5",
+    "12345678, 3.",
+    "12345678, 1e2",
+    "12345678, 1,5",
+    "12345678, +4",
+    "  12345678 ,4",
+    "12345678, 2.5\r",
+    "12345678 x:y, 3",
+    "# 12345678, 3",
+    "12345678, 0",
+    "12345678, -2",
+    "1234567, 3",
+    "123456789, 3",
+    "12345678",
+    "12345678, abc",
+    "12345678, 3 шт",
+]
+
+
+@pytest.mark.parametrize("line", LINES)
+def test_payload_matches_baseline_line_parser(line):
+    items = parse_subtract_payload(line, "7")
+    got = (items[0].article, items[0].qty, items[0].dept_id) if items else None
+    assert got == _baseline_parse_line(line, "7")
+
+
+def test_payload_parses_all_lines_of_a_message():
+    text = "\n".join(LINES)
+    expected = [r for r in (_baseline_parse_line(x, "7") for x in LINES) if r is not None]
+    got = [(i.article, i.qty, i.dept_id) for i in parse_subtract_payload(text, "7")]
+    assert got == expected
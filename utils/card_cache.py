@@ -5,7 +5,8 @@ L1/L2-кеш карток товарів.
 Призначення:
 - L1: ін-пам'яті кеш з TTL та обмеженням розміру (швидкий доступ у процесі).
 - L2: таблиця product_card_cache у БД (переживає рестарти, спільна для всіх інстансів).
-- API: get_card / set_card / update_file_id / invalidate / get_or_render_card.
+- API: get_card / set_card / update_file_id / invalidate / prefetch_cards / get_or_render_card
+  (+ async aget_or_render_card з single-flight для холодного кешу).
 
 Налаштування через .env:
     CARD_L1_TTL_SEC=300
@@ -15,32 +16,56 @@ L1/L2-кеш карток товарів.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import os
+import threading
 import time
 import logging
+from functools import lru_cache
+from collections import ChainMap, OrderedDict
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple
 
 from dotenv import load_dotenv
-from sqlalchemy import and_
+from sqlalchemy import and_, func, or_, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from database.orm.products import ProductCardCache  # type: ignore
+from database.session import get_session  # type: ignore
 
-load_dotenv(override=True)
+load_dotenv()
 logger = logging.getLogger(__name__)
 
 # ------------------------------ Конфіг ----------------------------------------
 
-CARD_L1_TTL_SEC = int(os.getenv("CARD_L1_TTL_SEC", "300") or 0)
-CARD_L1_MAX_ITEMS = int(os.getenv("CARD_L1_MAX_ITEMS", "5000") or 0)
-CARD_L2_ENABLED = os.getenv("CARD_L2_ENABLED", "1") in ("1", "true", "True", "yes", "YES")
+class _CardCacheConfig(NamedTuple):
+    l1_ttl_sec: int
+    l1_max_items: int
+    l2_enabled: bool
+
+
+@lru_cache(maxsize=1)
+def _cfg() -> _CardCacheConfig:
+    """
+    Налаштування кешу: env читається один раз на процес. Змінні процесу мають
+    пріоритет над .env (load_dotenv без override).
+    """
+    return _CardCacheConfig(
+        l1_ttl_sec=int(os.getenv("CARD_L1_TTL_SEC", "300") or 0),
+        l1_max_items=int(os.getenv("CARD_L1_MAX_ITEMS", "5000") or 0),
+        l2_enabled=os.getenv("CARD_L2_ENABLED", "1").strip().lower() in ("1", "true", "yes"),
+    )
 
 # ------------------------------ L1-кеш ----------------------------------------
 
 @dataclass
 class _L1Entry:
-    value: Dict[str, Any]
+    value: Mapping[str, Any]  # MappingProxyType — спільний для всіх читачів, не копіюється
     file_id: Optional[str]
     ts: float  # сек від epoch
 
@@ -48,41 +73,32 @@ class _L1Entry:
 class _LRUCache:
     """
     Примітивний LRU з TTL. Без сторонніх залежностей.
+    OrderedDict тримає порядок використання: торкання і витіснення — O(1).
     """
     def __init__(self, cap: int, ttl: int):
         self.cap = max(0, int(cap))
         self.ttl = max(0, int(ttl))
-        self._data: Dict[Tuple[str, str], _L1Entry] = {}
-        self._use: Dict[Tuple[str, str], float] = {}
-
-    def _evict_if_needed(self):
-        if self.cap <= 0 or len(self._data) <= self.cap:
-            return
-        k_old = min(self._use, key=self._use.get)
-        self._data.pop(k_old, None)
-        self._use.pop(k_old, None)
+        self._data: "OrderedDict[Tuple[str, str], _L1Entry]" = OrderedDict()
+        self.lock = threading.Lock()
 
     def get(self, key: Tuple[str, str]) -> Optional[_L1Entry]:
-        if key not in self._data:
+        e = self._data.get(key)
+        if e is None:
             return None
-        e = self._data[key]
-        now = time.time()
-        if self.ttl and now - e.ts > self.ttl:
+        if self.ttl and time.time() - e.ts > self.ttl:
             self._data.pop(key, None)
-            self._use.pop(key, None)
             return None
-        self._use[key] = now
+        self._data.move_to_end(key)
         return e
 
-    def set(self, key: Tuple[str, str], value: Dict[str, Any], file_id: Optional[str]) -> None:
-        now = time.time()
-        self._data[key] = _L1Entry(value=value, file_id=file_id, ts=now)
-        self._use[key] = now
-        self._evict_if_needed()
+    def set(self, key: Tuple[str, str], value: Mapping[str, Any], file_id: Optional[str]) -> None:
+        self._data[key] = _L1Entry(value=value, file_id=file_id, ts=time.time())
+        self._data.move_to_end(key)
+        if self.cap > 0 and len(self._data) > self.cap:
+            self._data.popitem(last=False)
 
     def invalidate(self, key: Tuple[str, str]) -> None:
         self._data.pop(key, None)
-        self._use.pop(key, None)
 
     def invalidate_many(self, keys: Iterable[Tuple[str, str]]) -> None:
         for k in keys:
@@ -90,10 +106,52 @@ class _LRUCache:
 
     def clear(self) -> None:
         self._data.clear()
-        self._use.clear()
 
 
-_L1 = _LRUCache(cap=CARD_L1_MAX_ITEMS, ttl=CARD_L1_TTL_SEC)
+class _ShardedLRU:
+    """
+    L1, розбитий на N шардів (N — степінь двійки), кожен під власним локом.
+    Ключ потрапляє в шард за hash(key) & (N-1): менша конкуренція за лок і
+    жодних незахищених мутацій словника з різних потоків. API — як у _LRUCache.
+    """
+    def __init__(self, cap: int, ttl: int, shards: int = 16):
+        per_shard = 0 if cap <= 0 else max(1, cap // shards)
+        self._shards = [_LRUCache(cap=per_shard, ttl=ttl) for _ in range(shards)]
+        self._mask = shards - 1
+
+    def _bucket(self, key: Tuple[str, str]) -> _LRUCache:
+        return self._shards[hash(key) & self._mask]
+
+    def get(self, key: Tuple[str, str]) -> Optional[_L1Entry]:
+        b = self._bucket(key)
+        with b.lock:
+            return b.get(key)
+
+    def set(self, key: Tuple[str, str], value: Mapping[str, Any], file_id: Optional[str]) -> None:
+        b = self._bucket(key)
+        with b.lock:
+            b.set(key, value, file_id)
+
+    def invalidate(self, key: Tuple[str, str]) -> None:
+        b = self._bucket(key)
+        with b.lock:
+            b.invalidate(key)
+
+    def invalidate_many(self, keys: Iterable[Tuple[str, str]]) -> None:
+        for k in keys:
+            self.invalidate(k)
+
+    def clear(self) -> None:
+        for b in self._shards:
+            with b.lock:
+                b.clear()
+
+
+@lru_cache(maxsize=1)
+def _l1() -> _ShardedLRU:
+    """L1 створюється ліниво, при першому зверненні (після того як env вже прочитано)."""
+    cfg = _cfg()
+    return _ShardedLRU(cap=cfg.l1_max_items, ttl=cfg.l1_ttl_sec, shards=16)
 
 # ------------------------------ Публічний API ---------------------------------
 
@@ -101,53 +159,93 @@ def cache_key(dept_id: str, article: str) -> Tuple[str, str]:
     return (str(dept_id), str(article))
 
 
-def get_card(session: Session, dept_id: str, article: str) -> Optional[Dict[str, Any]]:
+def _freeze(card_json: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Одна копія при записі в L1 → read-only view; далі читачі отримують її без копіювання."""
+    if isinstance(card_json, MappingProxyType):
+        return card_json
+    return MappingProxyType(dict(card_json))
+
+
+def _with_file_id(value: Mapping[str, Any], file_id: Optional[str]) -> Mapping[str, Any]:
+    """file_id додається як «нижчий» шар: значення з самої картки має пріоритет (як setdefault)."""
+    return ChainMap(value, {"file_id": file_id}) if file_id else value
+
+
+def _upsert_insert(session: Session):
+    """insert() з підтримкою ON CONFLICT для діалекту сесії (PostgreSQL/SQLite)."""
+    return sqlite_insert if session.get_bind().dialect.name == "sqlite" else pg_insert
+
+
+def get_card(session: Session, dept_id: str, article: str) -> Optional[Mapping[str, Any]]:
     """
     Отримати картку: L1 → L2 → None.
-    Повертає card_json і додає 'file_id', якщо є.
+    Повертає read-only mapping з card_json і 'file_id', якщо є. Не мутувати.
     """
     k = cache_key(dept_id, article)
 
     # L1
-    e = _L1.get(k)
+    e = _l1().get(k)
     if e:
-        data = dict(e.value)
-        if e.file_id:
-            data.setdefault("file_id", e.file_id)
-        return data
+        return _with_file_id(e.value, e.file_id)
 
     # L2
-    if CARD_L2_ENABLED:
+    if _cfg().l2_enabled:
         row = session.query(ProductCardCache).filter(
             and_(ProductCardCache.dept_id == k[0], ProductCardCache.article == k[1])
         ).one_or_none()
         if row:
-            data = dict(row.card_json or {})
-            if row.file_id:
-                data.setdefault("file_id", row.file_id)
-            _L1.set(k, data, row.file_id)
-            return data
+            value = _freeze(row.card_json or {})
+            _l1().set(k, value, row.file_id)
+            return _with_file_id(value, row.file_id)
 
     return None
 
 
+def _payload_hash(card_json: Mapping[str, Any]) -> int:
+    """Стабільний 64-бітний геш card_json (знаковий — під колонку BIGINT)."""
+    raw = json.dumps(card_json, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
 def set_card(session: Session, dept_id: str, article: str, card_json: Dict[str, Any], file_id: Optional[str] = None) -> None:
     """
     Зберегти картку в L1 і L2.
+    Якщо вміст не змінився (той самий геш card_json і file_id) — L2 не переписується.
     """
     k = cache_key(dept_id, article)
-    _L1.set(k, card_json, file_id)
-
-    if CARD_L2_ENABLED:
-        row = session.query(ProductCardCache).filter(
-            and_(ProductCardCache.dept_id == k[0], ProductCardCache.article == k[1])
-        ).one_or_none()
-        if not row:
-            row = ProductCardCache(dept_id=k[0], article=k[1])
-            session.add(row)
-        row.card_json = card_json
-        if file_id is not None:
-            row.file_id = file_id  # збережемо актуальний file_id
+    l1 = _l1()
+    prev = l1.get(k)
+    if prev is not None and prev.value == card_json and (file_id is None or file_id == prev.file_id):
+        # L1 вже тримає рівно це, а L1 і L2 інвалідуються разом — писати нічого
+        return
+    l1.set(k, _freeze(card_json), file_id if file_id is not None else (prev.file_id if prev else None))
+
+    if _cfg().l2_enabled:
+        # Один атомарний UPSERT по uq_cardcache_dept_article замість SELECT + INSERT/UPDATE
+        stmt = _upsert_insert(session)(ProductCardCache).values(
+            dept_id=k[0], article=k[1], card_json=card_json, file_id=file_id,
+            payload_hash=_payload_hash(card_json),
+        )
+        cur = ProductCardCache.__table__.c
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["dept_id", "article"],
+            set_={
+                "card_json": stmt.excluded.card_json,
+                "payload_hash": stmt.excluded.payload_hash,
+                # None не затирає збережений file_id
+                "file_id": func.coalesce(stmt.excluded.file_id, cur.file_id),
+                "updated_at": func.now(),
+            },
+            # Незмінний рядок не чіпаємо: без UPDATE — без нової версії рядка і WAL
+            where=or_(
+                cur.payload_hash.is_distinct_from(stmt.excluded.payload_hash),
+                and_(
+                    stmt.excluded.file_id.is_not(None),
+                    cur.file_id.is_distinct_from(stmt.excluded.file_id),
+                ),
+            ),
+        )
+        session.execute(stmt)
 
 
 def update_file_id(session: Session, dept_id: str, article: str, file_id: Optional[str]) -> None:
@@ -155,16 +253,17 @@ def update_file_id(session: Session, dept_id: str, article: str, file_id: Option
     Оновити тільки file_id у кеші.
     """
     k = cache_key(dept_id, article)
-    e = _L1.get(k)
+    e = _l1().get(k)
     if e:
-        _L1.set(k, e.value, file_id)
+        _l1().set(k, e.value, file_id)
 
-    if CARD_L2_ENABLED:
-        row = session.query(ProductCardCache).filter(
-            and_(ProductCardCache.dept_id == k[0], ProductCardCache.article == k[1])
-        ).one_or_none()
-        if row:
-            row.file_id = file_id
+    if _cfg().l2_enabled:
+        # Лише file_id і лише для наявного запису (без card_json вставляти нічого)
+        session.execute(
+            update(ProductCardCache)
+            .where(ProductCardCache.dept_id == k[0], ProductCardCache.article == k[1])
+            .values(file_id=file_id, updated_at=func.now())
+        )
 
 
 def invalidate(session: Session, dept_id: str, article: str) -> None:
@@ -172,34 +271,73 @@ def invalidate(session: Session, dept_id: str, article: str) -> None:
     Видалити запис з L1 і L2 (щоб наступне відкриття картки зрендерило свіжі дані).
     """
     k = cache_key(dept_id, article)
-    _L1.invalidate(k)
-    if CARD_L2_ENABLED:
+    _l1().invalidate(k)
+    if _cfg().l2_enabled:
         session.query(ProductCardCache).filter(
             and_(ProductCardCache.dept_id == k[0], ProductCardCache.article == k[1])
         ).delete(synchronize_session=False)
 
 
+def _keys_filters(session: Session, keys: list):
+    """
+    Умови WHERE для набору пар (dept_id, article): один tuple IN на PostgreSQL,
+    на SQLite (без row-value IN у старих версіях) — OR пачками по 500 пар.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        for i in range(0, len(keys), 500):
+            yield or_(*(
+                and_(ProductCardCache.dept_id == d, ProductCardCache.article == a)
+                for d, a in keys[i:i + 500]
+            ))
+    else:
+        yield tuple_(ProductCardCache.dept_id, ProductCardCache.article).in_(keys)
+
+
 def invalidate_many(session: Session, pairs: Iterable[Tuple[str, str]]) -> None:
     keys = [cache_key(d, a) for d, a in pairs]
-    _L1.invalidate_many(keys)
-    if CARD_L2_ENABLED and keys:
-        for d, a in keys:
-            session.query(ProductCardCache).filter(
-                and_(ProductCardCache.dept_id == d, ProductCardCache.article == a)
-            ).delete(synchronize_session=False)
+    _l1().invalidate_many(keys)
+    if _cfg().l2_enabled and keys:
+        for cond in _keys_filters(session, keys):
+            session.query(ProductCardCache).filter(cond).delete(synchronize_session=False)
+
+
+def prefetch_cards(session: Session, pairs: Iterable[Tuple[str, str]]) -> int:
+    """
+    Прогріти L1 для списку карток одним запитом до L2 (замість N окремих SELECT
+    при послідовному відкритті). Ключі, що вже є в L1, пропускаються.
+    Повертає кількість завантажених карток.
+    """
+    if not _cfg().l2_enabled:
+        return 0
+    l1 = _l1()
+    keys = [k for k in dict.fromkeys(cache_key(d, a) for d, a in pairs) if l1.get(k) is None]
+    if not keys:
+        return 0
+    cc = ProductCardCache
+    loaded = 0
+    for cond in _keys_filters(session, keys):
+        for dept_id, article, card_json, file_id in session.query(
+            cc.dept_id, cc.article, cc.card_json, cc.file_id
+        ).filter(cond):
+            l1.set((dept_id, article), _freeze(card_json or {}), file_id)
+            loaded += 1
+    return loaded
 
 
 def clear_l1() -> None:
     """Очистити L1 повністю (наприклад, при релізі)."""
-    _L1.clear()
+    _l1().clear()
 
 
 # ------------------------------ Шорткат ---------------------------------------
 
-def get_or_render_card(session: Session, dept_id: str, article: str, renderer) -> Dict[str, Any]:
+def get_or_render_card(session: Session, dept_id: str, article: str, renderer, text_renderer=None) -> Mapping[str, Any]:
     """
     Повертає картку з кешу або викликає renderer(dept_id, article) -> (card_json, file_id)
     і зберігає результат у кеш.
+
+    Якщо передано text_renderer(card_json) -> str, готовий текст картки кладеться
+    у card_json["_rendered_html"] разом із JSON, тож повторні відкриття його не збирають.
     """
     cached = get_card(session, dept_id, article)
     if cached is not None:
@@ -208,5 +346,67 @@ def get_or_render_card(session: Session, dept_id: str, article: str, renderer) -
     card_json, file_id = renderer(session, dept_id, article)
     if not isinstance(card_json, dict):
         raise ValueError("renderer має повертати (dict, file_id|None)")
+    if text_renderer is not None:
+        card_json["_rendered_html"] = text_renderer(card_json)
     set_card(session, dept_id, article, card_json, file_id)
     return dict(card_json, **({"file_id": file_id} if file_id else {}))
+
+
+# Рендери, що виконуються зараз: ключ → Future з результатом (single-flight)
+_inflight: Dict[Tuple[str, str], "asyncio.Future[Mapping[str, Any]]"] = {}
+
+
+class _RenderAbandoned(Exception):
+    """Лідер single-flight рендеру скасований; очікувачі мають повторити спробу."""
+
+
+def _load_card_sync(dept_id: str, article: str, renderer, text_renderer) -> Mapping[str, Any]:
+    with get_session() as s:
+        card = get_or_render_card(s, dept_id, article, renderer, text_renderer)
+        s.commit()
+    return card
+
+
+async def aget_or_render_card(dept_id: str, article: str, renderer, text_renderer=None) -> Mapping[str, Any]:
+    """
+    Async-варіант get_or_render_card для хендлерів.
+
+    - L1-хіт віддається одразу, без потоку і сесії.
+    - Інакше L2/рендер виконуються в thread-пулі з власною сесією (з commit).
+    - Паралельні запити тієї ж холодної картки чекають один спільний Future:
+      рендер і UPSERT у L2 відбуваються один раз, а не N.
+    """
+    k = cache_key(dept_id, article)
+    e = _l1().get(k)
+    if e:
+        return _with_file_id(e.value, e.file_id)
+
+    while (fut := _inflight.get(k)) is not None:
+        try:
+            # shield: скасування одного з очікувачів не скасовує спільний результат
+            return await asyncio.shield(fut)
+        except _RenderAbandoned:
+            # Лідера скасовано (напр. таймаут його хендлера) — самі ж очікувачі
+            # не скасовані, тож пробуємо ще раз: стаємо лідером або чекаємо нового
+            continue
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[k] = fut
+    try:
+        card = await asyncio.to_thread(_load_card_sync, k[0], k[1], renderer, text_renderer)
+    except asyncio.CancelledError:
+        # Не fut.cancel(): це кинуло б CancelledError у кожного очікувача
+        fut.set_exception(_RenderAbandoned())
+        fut.exception()
+        raise
+    except Exception as exc:
+        fut.set_exception(exc)
+        # Якщо ніхто більше не чекав — не лишаємо «невитягнутий» виняток у Future
+        fut.exception()
+        raise
+    else:
+        fut.set_result(card)
+        return card
+    finally:
+        if _inflight.get(k) is fut:
+            del _inflight[k]
@@ -10,9 +10,12 @@
 без дробової частини (наприклад, ``5`` замість ``5.0``).
 """
 
+import asyncio
 import logging
+from functools import lru_cache
 from typing import Union
 
+from cachetools import LRUCache
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message
@@ -28,6 +31,25 @@ from utils.markdown_corrector import escape_markdown
 
 logger = logging.getLogger(__name__)
 
+# Останній відрендерений вміст картки: (chat_id, message_id) → геш (текст, клавіатура).
+# Скидається middlewares.render_cache при будь-якому іншому редагуванні повідомлення.
+_LAST_RENDER: "LRUCache[tuple[int, int], int]" = LRUCache(maxsize=10_000)
+
+
+@lru_cache(maxsize=50_000)
+def _esc(s: str) -> str:
+    """escape_markdown для незмінних полів товару (назва, відділ, група) — з кешем."""
+    return escape_markdown(s)
+
+
+def _render_signature(text: str, keyboard) -> int:
+    return hash((text, keyboard.model_dump_json() if keyboard is not None else ""))
+
+
+def forget_rendered_card(chat_id: int, message_id: int) -> None:
+    """Забути збережений підпис картки для повідомлення (його змінили/видалили)."""
+    _LAST_RENDER.pop((chat_id, message_id), None)
+
 
 def format_quantity(quantity_str: str) -> Union[int, float, str]:
     """
@@ -36,12 +58,26 @@ def format_quantity(quantity_str: str) -> Union[int, float, str]:
     Якщо конвертація неможлива, повертає оригінальний рядок.
     """
     try:
-        quantity_float = float(str(quantity_str).replace(',', '.'))
+        quantity_float = _to_float(quantity_str)
         return int(quantity_float) if quantity_float.is_integer() else quantity_float
     except (ValueError, TypeError):
         return quantity_str
 
 
+def _to_float(value) -> float:
+    """
+    float з числа або рядка з десятковою комою. Значення з БД зазвичай уже
+    числові — для них без str()/replace().
+    """
+    if isinstance(value, bool):
+        raise TypeError("bool не є кількістю")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return float(value.replace(',', '.'))
+    return float(str(value).replace(',', '.'))
+
+
 async def send_or_edit_product_card(
     bot: Bot,
     chat_id: int,
@@ -55,12 +91,15 @@ async def send_or_edit_product_card(
     Тепер повертає об'єкт надісланого або відредагованого повідомлення.
     """
     try:
-        in_user_temp_list_qty = await orm_get_temp_list_item_quantity(user_id, product.id)
-        total_temp_reserved = await orm_get_total_temp_reservation_for_product(product.id)
+        # Незалежні запити (кожен зі своєю сесією) — паралельно, один RTT замість двох
+        in_user_temp_list_qty, total_temp_reserved = await asyncio.gather(
+            orm_get_temp_list_item_quantity(user_id, product.id),
+            orm_get_total_temp_reservation_for_product(product.id),
+        )
 
         try:
             # Загальна кількість товару на складі
-            stock_quantity = float(str(product.кількість).replace(',', '.'))
+            stock_quantity = _to_float(product.кількість)
             # Постійно зарезервована кількість (значення з БД)
             permanently_reserved = product.відкладено or 0
             # Доступно для будь‑кого = на складі – відкладено – тимчасові резерви інших користувачів
@@ -95,10 +134,11 @@ async def send_or_edit_product_card(
             display_months = "---"
 
         # Формування тексту картки з екрануванням для Markdown
-        card_text = LEXICON.PRODUCT_CARD_TEMPLATE.format(
-            name=escape_markdown(product.назва),
-            department=escape_markdown(product.відділ),
-            group=escape_markdown(product.група or ""),
+        card_text = LEXICON.render(
+            "PRODUCT_CARD_TEMPLATE",
+            name=_esc(str(product.назва)),
+            department=_esc(str(product.відділ)),
+            group=_esc(str(product.група or "")),
             months_no_movement=escape_markdown(display_months),
             stock_sum=escape_markdown(display_stock_sum),
             available_qty=escape_markdown(display_available_qty),
@@ -113,7 +153,11 @@ async def send_or_edit_product_card(
         )
 
         sent_message: Message | None = None
+        signature = _render_signature(card_text, keyboard)
         if message_id:
+            if _LAST_RENDER.get((chat_id, message_id)) == signature:
+                # Повідомлення вже показує саме цю картку — те саме, що "not modified", без запиту
+                return None
             try:
                 sent_message = await bot.edit_message_text(
                     text=card_text,
@@ -124,8 +168,10 @@ async def send_or_edit_product_card(
             except TelegramBadRequest as e:
                 if "message is not modified" not in str(e):
                     raise
+            _LAST_RENDER[(chat_id, message_id)] = signature
         else:
             sent_message = await bot.send_message(chat_id, card_text, reply_markup=keyboard)
+            _LAST_RENDER[(chat_id, sent_message.message_id)] = signature
 
         return sent_message
 
@@ -7,34 +7,89 @@
 - Виправляти EXIF-орієнтацію, очищати метадані.
 - Робити стиснення, ресайз до ліміту по довшій стороні.
 - Генерувати прев'ю (thumbnail).
-- Обчислювати стабільний геш для дедуплікації (aHash + SHA256).
+- Обчислювати стабільний геш для дедуплікації (pHash + aHash + SHA256).
 
 Залежності:
-    Pillow (PIL)
+    Pillow (PIL), numpy
+    jpegoptim (опційно, IMAGE_JPEGOPTIM=1) — безвтратне доущільнення JPEG
 
 Публічні функції:
-    load_image(bytes_data) -> PIL.Image.Image
+    load_image(bytes_data, draft_side=None) -> PIL.Image.Image
+    optimize_for_telegram_async(bytes_data) -> dict   (у пулі процесів, поза event loop)
     optimize_image(bytes_data, *, max_side=1280, thumb_side=512, quality=85, fmt="JPEG") -> dict
+    Окремі кроки (якщо потрібна лише частина конвеєра, напр. тільки геші для дедуплікації):
+        decode_and_normalize(bytes_data, draft_side=None) -> PIL.Image.Image
+        make_main(img, *, max_side=1280, quality=85, fmt="JPEG") -> (PIL.Image.Image, bytes)
+        make_thumb(main_img, *, thumb_side=512, quality=80, fmt="JPEG") -> bytes
+        image_hashes(main_img) -> dict        (ahash / phash / phash_int)
+        dedup_hashes(bytes_data, *, max_side=1280) -> dict   (без кодування JPEG)
     compute_ahash(img: PIL.Image.Image, hash_size=8) -> str
-    compute_sha256(data: bytes) -> str
+    compute_phash(img: PIL.Image.Image, hash_size=8) -> str
+    hamming_distance(hex_a, hex_b) -> int
+    hash_to_int64(hex_str) -> int
+    compute_sha256(data: bytes | BinaryIO) -> str
 """
 
 from __future__ import annotations
 
+import asyncio
 import io
 import hashlib
-from typing import Dict, Tuple
-
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+import numpy as np
+import PIL
 from PIL import Image, ImageOps
 
+logger = logging.getLogger(__name__)
+
+# Pillow-SIMD має ту саму API, версії виду "9.5.0.post2" — лише для діагностики
+PIL_SIMD = ".post" in PIL.__version__
+logger.info("Pillow %s (%s)", PIL.__version__, "SIMD" if PIL_SIMD else "звичайний")
+
+# Опційно: scipy.fft для DCT (інакше — множення на кешовану DCT-матрицю)
+try:
+    from scipy.fft import dctn as _scipy_dctn  # type: ignore
+except ImportError:  # pragma: no cover
+    _scipy_dctn = None
+
+# Опційно: прогнати готові JPEG через jpegoptim (без втрат: оптимальні Гаффман-таблиці, strip)
+IMAGE_JPEGOPTIM = os.getenv("IMAGE_JPEGOPTIM", "0").strip().lower() in ("1", "true", "yes", "on")
+_JPEGOPTIM_BIN = shutil.which("jpegoptim") if IMAGE_JPEGOPTIM else None
+_JPEGOPTIM_TIMEOUT = 10
+
+# Скільки процесів обробляють фото паралельно (0 — у потоці поточного процесу)
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))) or 0)
+
+# Як у Image.thumbnail(): box-reduce до ≥2× цільового розміру, далі LANCZOS
+_REDUCING_GAP = 2.0
+
 
 # ------------------------------ Базові утиліти --------------------------------
 
-def load_image(bytes_data: bytes) -> Image.Image:
+def load_image(bytes_data: bytes, draft_side: Optional[int] = None) -> Image.Image:
     """
     Відкрити зображення з bytes у режимі "RGB" без метаданих і з поправкою EXIF-орієнтації.
+
+    draft_side — для JPEG просить libjpeg декодувати одразу у зменшеному масштабі
+    (1/2, 1/4, 1/8), але не менше draft_side по кожній стороні. Остаточний ресайз
+    робить _resize_max_side, тож якість не страждає, а декод дешевшає в рази.
     """
     im = Image.open(io.BytesIO(bytes_data))
+    if draft_side and im.format == "JPEG":
+        try:
+            im.draft("RGB", (draft_side, draft_side))
+        except Exception:
+            # draft — лише оптимізація; на дивних JPEG декодуємо як є
+            pass
     # Вирівняти орієнтацію за EXIF, якщо є
     try:
         im = ImageOps.exif_transpose(im)
@@ -52,17 +107,20 @@ def load_image(bytes_data: bytes) -> Image.Image:
 
 def _strip_metadata(img: Image.Image) -> Image.Image:
     """
-    Повернути копію без метаданих (EXIF, ICC).
+    Прибрати метадані (EXIF, ICC) без копіювання пікселів.
+
+    save() пише EXIF/ICC лише з явних аргументів, тож достатньо очистити info
+    (щоб нічого не «протекло» через ресайз/подальші обгортки). Зображення
+    щойно створене load_image і належить нам — мутувати безпечно.
     """
-    out = Image.new(img.mode, img.size)
-    out.putdata(list(img.getdata()))
-    return out
+    img.info = {}
+    return img
 
 
-def _resize_max_side(img: Image.Image, max_side: int) -> Image.Image:
+def _resize_max_side(img: Image.Image, max_side: int, resample: int = Image.LANCZOS) -> Image.Image:
     """
     Пропорційно зменшити зображення так, щоб найбільша сторона була <= max_side.
-    Якщо вже менше — не змінюємо.
+    Якщо вже менше — не змінюємо. resample — фільтр Pillow (за замовчуванням LANCZOS).
     """
     w, h = img.size
     side = max(w, h)
@@ -70,19 +128,35 @@ def _resize_max_side(img: Image.Image, max_side: int) -> Image.Image:
         return img
     scale = max_side / float(side)
     new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
-    return img.resize(new_size, Image.LANCZOS)
+    # reducing_gap: при сильному зменшенні спершу дешевий box-reduce у C (Image.reduce),
+    # далі LANCZOS лише на проміжному (≥2× цільового) зображенні
+    return img.resize(new_size, resample, reducing_gap=_REDUCING_GAP)
 
 
-def _save_bytes(img: Image.Image, *, fmt: str = "JPEG", quality: int = 85, optimize: bool = True) -> bytes:
+def _save_bytes(
+    img: Image.Image,
+    *,
+    fmt: str = "JPEG",
+    quality: int = 85,
+    optimize: bool = True,
+    progressive: bool = True,
+) -> bytes:
     """
     Зберегти у bytes із заданим форматом.
     Для JPEG: вмикаємо subsampling=1 (chroma subsampling), progressive.
+    optimize=False, progressive=False — швидкий baseline-кодек без зайвих проходів
+    (для мініатюр, де кілька відсотків розміру не важливі).
     Для WEBP: quality впливає на розмір, lossless=False.
     """
     buf = io.BytesIO()
     fmt_u = fmt.upper()
     if fmt_u == "JPEG":
-        img.save(buf, format="JPEG", quality=max(1, min(quality, 95)), optimize=optimize, progressive=True, subsampling="4:2:0")
+        img.save(
+            buf, format="JPEG", quality=max(1, min(quality, 95)),
+            optimize=optimize, progressive=progressive, subsampling="4:2:0",
+        )
+        if _JPEGOPTIM_BIN and optimize:
+            return _jpegoptim(buf.getvalue())
     elif fmt_u == "WEBP":
         img.save(buf, format="WEBP", quality=max(1, min(quality, 95)), method=6)
     else:
@@ -90,6 +164,27 @@ def _save_bytes(img: Image.Image, *, fmt: str = "JPEG", quality: int = 85, optim
     return buf.getvalue()
 
 
+def _jpegoptim(data: bytes) -> bytes:
+    """
+    Доущільнити JPEG через jpegoptim (stdin → stdout). Якщо щось пішло не так
+    або результат не менший — повертаємо оригінал.
+    """
+    try:
+        res = subprocess.run(
+            [_JPEGOPTIM_BIN, "--quiet", "--strip-all", "--all-progressive", "--stdin", "--stdout"],
+            input=data,
+            capture_output=True,
+            timeout=_JPEGOPTIM_TIMEOUT,
+            check=False,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return data
+    out = res.stdout
+    if res.returncode != 0 or not out or len(out) >= len(data):
+        return data
+    return out
+
+
 # ------------------------------ Геші ------------------------------------------
 
 def compute_ahash(img: Image.Image, hash_size: int = 8) -> str:
@@ -98,24 +193,123 @@ def compute_ahash(img: Image.Image, hash_size: int = 8) -> str:
     """
     # Градації сірого, зменшення
     small = img.convert("L").resize((hash_size, hash_size), Image.LANCZOS)
-    # Середнє значення яскравості
-    pixels = list(small.getdata())
-    avg = sum(pixels) / float(len(pixels)) if pixels else 0
-    bits = ["1" if p >= avg else "0" for p in pixels]
-    # Пакуємо по 4 біти в hex
-    out = []
-    for i in range(0, len(bits), 4):
-        nibble = bits[i:i + 4]
-        out.append(f"{int(''.join(nibble), 2):x}")
-    return "".join(out)
+    # Порівняння із середньою яскравістю і пакування бітів — векторно
+    pixels = np.asarray(small, dtype=np.uint8).ravel()
+    bits = pixels >= pixels.mean()
+    # Повні nibble — через packbits (зайвий доповнений nibble відрізаємо)
+    full = bits.size & ~3
+    out = np.packbits(bits[:full]).tobytes().hex()[: full // 4]
+    # Неповний останній nibble (hash_size² не кратне 4) — значення з наявних бітів,
+    # вирівняне праворуч, як у попередньому пакуванні по 4 біти
+    tail = bits[full:]
+    if tail.size:
+        out += f"{int(np.packbits(tail)[0]) >> (8 - tail.size):x}"
+    return out
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Матриця DCT-II (ненормована, як у scipy.fftpack.dct) розміру n×n."""
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    return 2.0 * np.cos(np.pi * (2 * i + 1) * k / (2.0 * n))
+
+
+def compute_phash(img: Image.Image, hash_size: int = 8, highfreq_factor: int = 4) -> str:
+    """
+    Perceptual DCT-hash (pHash): 32×32 сірий → 2D DCT → лівий верхній блок 8×8,
+    бінаризований відносно медіани. Повертає hex-рядок (64 біти → 16 символів).
+    Стійкіший за aHash до перестиснення і дрібних правок.
+    """
+    size = hash_size * highfreq_factor
+    small = img.convert("L").resize((size, size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    if _scipy_dctn is not None:
+        # type=2, norm=None — той самий масштаб, що й у _dct_matrix, геші збігаються
+        coeffs = _scipy_dctn(pixels, type=2)
+    else:
+        dct = _dct_matrix(size)
+        coeffs = dct @ pixels @ dct.T
+    low = coeffs[:hash_size, :hash_size]
+    # Біти пакуються векторно (старший біт — перший коефіцієнт)
+    packed = np.packbits(low > np.median(low))
+    return packed.tobytes().hex()
+
+
+def hamming_distance(hex_a: str, hex_b: str) -> int:
+    """Кількість різних бітів між двома hex-гешами однакової довжини."""
+    return bin(int(hex_a, 16) ^ int(hex_b, 16)).count("1")
+
+
+def hash_to_int64(hex_str: str) -> int:
+    """
+    64-бітний hex-геш → знакове int64 (для колонки BIGINT).
+    Бітовий патерн той самий, тож XOR/popcount дають ту саму відстань.
+    """
+    value = int(hex_str, 16)
+    return value - (1 << 64) if value >= (1 << 63) else value
 
 
-def compute_sha256(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+def compute_sha256(data: Union[bytes, BinaryIO]) -> str:
+    """
+    SHA-256 як hex. Приймає bytes або файлоподібний об'єкт (великі оригінали
+    хешуються потоково, без читання в один буфер).
+    usedforsecurity=False: геш лише для дедуплікації, OpenSSL-реалізація (SHA-NI).
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return hashlib.new("sha256", data, usedforsecurity=False).hexdigest()
+    if hasattr(hashlib, "file_digest"):  # Python 3.11+
+        return hashlib.file_digest(data, lambda: hashlib.new("sha256", usedforsecurity=False)).hexdigest()
+    h = hashlib.new("sha256", usedforsecurity=False)
+    for chunk in iter(lambda: data.read(1 << 20), b""):
+        h.update(chunk)
+    return h.hexdigest()
 
 
 # ------------------------------ Головне API -----------------------------------
 
+def decode_and_normalize(bytes_data: bytes, draft_side: Optional[int] = None) -> Image.Image:
+    """Декодувати (з draft для JPEG), вирівняти за EXIF, прибрати метадані."""
+    return _strip_metadata(load_image(bytes_data, draft_side=draft_side))
+
+
+def make_main(
+    img: Image.Image, *, max_side: int = 1280, quality: int = 85, fmt: str = "JPEG"
+) -> Tuple[Image.Image, bytes]:
+    """Основне зображення: ресайз до max_side (LANCZOS) і кодування. → (img, bytes)"""
+    main_img = _resize_max_side(img, max_side)
+    return main_img, _save_bytes(main_img, fmt=fmt, quality=quality, optimize=True)
+
+
+def make_thumb(main_img: Image.Image, *, thumb_side: int = 512, quality: int = 80, fmt: str = "JPEG") -> bytes:
+    """
+    Прев'ю з уже зменшеного основного (менше пікселів на вході ресайзу);
+    для мініатюри BILINEAR візуально не гірший за LANCZOS, а ядро значно менше.
+    """
+    thumb_img = _resize_max_side(main_img, thumb_side, resample=Image.BILINEAR)
+    return _save_bytes(thumb_img, fmt=fmt, quality=quality, optimize=False, progressive=False)
+
+
+def image_hashes(main_img: Image.Image) -> Dict[str, object]:
+    """Перцептивні геші основного зображення: ahash, phash (hex) і phash_int (int64)."""
+    phex = compute_phash(main_img, hash_size=8)
+    return {
+        "ahash": compute_ahash(main_img, hash_size=8),
+        "phash": phex,
+        "phash_int": hash_to_int64(phex),
+    }
+
+
+def dedup_hashes(bytes_data: bytes, *, max_side: int = 1280) -> Dict[str, object]:
+    """
+    Лише геші для перевірки на дубль — без кодування main/thumb.
+    Рахуються з того самого зменшеного до max_side зображення, що й в optimize_image,
+    тож збігаються з тим, що зберігається в БД.
+    """
+    img = decode_and_normalize(bytes_data, draft_side=max_side)
+    return image_hashes(_resize_max_side(img, max_side))
+
+
 def optimize_image(
     bytes_data: bytes,
     *,
@@ -126,6 +320,7 @@ def optimize_image(
 ) -> Dict[str, object]:
     """
     Приймає bytes оригіналу, повертає словник з оптимізованими байтами і метаданими.
+    Зручна обгортка над decode_and_normalize / make_main / make_thumb / image_hashes.
 
     Параметри:
         max_side  — довша сторона для основного зображення
@@ -142,26 +337,21 @@ def optimize_image(
           "bytes_thumb": bytes,
           "sha256_main": str,
           "sha256_thumb": str,
-          "ahash": str,              # aHash від основного зображення
+          "ahash": str,              # aHash від основного зображення (дешевий префільтр)
+          "phash": str,              # pHash від основного зображення (для дедуплікації)
+          "phash_int": int,          # той самий pHash як знакове int64 (колонка BIGINT)
         }
     """
     # 1) Завантажити і нормалізувати
-    img = load_image(bytes_data)
-    img = _strip_metadata(img)
+    img = decode_and_normalize(bytes_data, draft_side=max(max_side, thumb_side))
 
     # 2) Основне зображення
-    main_img = _resize_max_side(img, max_side)
-    main_bytes = _save_bytes(main_img, fmt=fmt, quality=quality, optimize=True)
+    main_img, main_bytes = make_main(img, max_side=max_side, quality=quality, fmt=fmt)
 
     # 3) Прев'ю
-    thumb_img = _resize_max_side(img, thumb_side)
-    thumb_bytes = _save_bytes(thumb_img, fmt=fmt, quality=min(quality, 80), optimize=True)
+    thumb_bytes = make_thumb(main_img, thumb_side=thumb_side, quality=min(quality, 80), fmt=fmt)
 
     # 4) Геші
-    ahex = compute_ahash(main_img, hash_size=8)
-    sha_main = compute_sha256(main_bytes)
-    sha_thumb = compute_sha256(thumb_bytes)
-
     w, h = main_img.size
 
     return {
@@ -170,9 +360,9 @@ def optimize_image(
         "height": int(h),
         "bytes_main": main_bytes,
         "bytes_thumb": thumb_bytes,
-        "sha256_main": sha_main,
-        "sha256_thumb": sha_thumb,
-        "ahash": ahex,
+        "sha256_main": compute_sha256(main_bytes),
+        "sha256_thumb": compute_sha256(thumb_bytes),
+        **image_hashes(main_img),
     }
 
 
@@ -186,6 +376,39 @@ def optimize_for_telegram(bytes_data: bytes) -> Dict[str, object]:
     return optimize_image(bytes_data, max_side=1280, thumb_side=512, quality=85, fmt="JPEG")
 
 
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Пул процесів створюється ліниво, при першому фото. spawn, а не fork:
+    воркерам не потрібні (і не повинні дістатися) з'єднання з БД чи сесія бота.
+    """
+    global _POOL
+    if IMAGE_PROCESS_WORKERS <= 0:
+        return None
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ProcessPoolExecutor(
+                    max_workers=IMAGE_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _POOL
+
+
+async def optimize_for_telegram_async(bytes_data: bytes) -> Dict[str, object]:
+    """
+    optimize_for_telegram поза event loop: у пулі процесів (усі ядра, без GIL),
+    або в потоці, якщо IMAGE_PROCESS_WORKERS=0.
+    """
+    pool = _get_pool()
+    if pool is None:
+        return await asyncio.to_thread(optimize_for_telegram, bytes_data)
+    return await asyncio.get_running_loop().run_in_executor(pool, optimize_for_telegram, bytes_data)
+
+
 def optimize_light(bytes_data: bytes) -> Dict[str, object]:
     """
     Легкий профіль для списків/мініатюр:
@@ -37,6 +37,7 @@ import re
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
 # М'яке приведення чисел використовуємо з утиліт вводу/виводу
@@ -100,6 +101,9 @@ CANON_ORDER = [
 
 # Артикул: рівно 8 цифр на початку назви — наш стандарт
 ARTICLE_RE = re.compile(r"^\s*(\d{8})\b")
+# Клітинка артикулу цілком: 8 цифр, допускається хвіст ".0" від Excel-чисел;
+# пробіли по краях поглинає сам шаблон (без окремого .str.strip())
+_ARTICLE_CELL_RE = r"^\s*(\d{8})(?:\.0+)?\s*$"
 
 
 # ------------------------------- Винятки -------------------------------------
@@ -131,6 +135,9 @@ class NormalizedImport:
 
 # --------------------------- Допоміжні функції -------------------------------
 
+_WS_RE = re.compile(r"\s+")
+
+
 def _normalize_header(h: str) -> str:
     """Нормалізувати заголовок: пробіли, нижній регістр, прибрати сміття."""
     if h is None:
@@ -138,7 +145,7 @@ def _normalize_header(h: str) -> str:
     s = str(h).strip().lower()
     # Часті небажані символи у заголовках
     s = s.replace("\n", " ").replace("\r", " ").replace("\t", " ")
-    s = re.sub(r"\s+", " ", s)
+    s = _WS_RE.sub(" ", s)
     return s
 
 
@@ -157,6 +164,11 @@ def _build_reverse_index() -> Dict[str, str]:
 
 REV_INDEX = _build_reverse_index()
 
+# Нормалізовані синоніми для м'якої евристики — рахуються один раз при імпорті
+NORM_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    canon: tuple(_normalize_header(s) for s in syns) for canon, syns in SYNONYMS.items()
+}
+
 
 def _match_headers(raw_headers: Sequence[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
     """
@@ -185,8 +197,8 @@ def _match_headers(raw_headers: Sequence[str]) -> Tuple[Dict[str, str], Dict[str
             if h in reverse:
                 continue
             # прості евристики: "назва", "наименование", "name" тощо — часткові збіги
-            for syn in SYNONYMS.get(canon, []):
-                if _normalize_header(syn) in norm or norm in _normalize_header(syn):
+            for syn in NORM_SYNONYMS.get(canon, ()):
+                if syn in norm or norm in syn:
                     mapping[canon] = h
                     reverse[h] = canon
                     break
@@ -209,6 +221,32 @@ def _extract_article_from_name(name: str) -> Optional[str]:
     return m.group(1)
 
 
+def _extract_articles_from_names(names: pd.Series) -> pd.Series:
+    """
+    Векторний варіант _extract_article_from_name для цілої колонки.
+    .str на object-колонці дає NaN для не-рядків — як і isinstance-перевірка вище.
+    """
+    if not (pd.api.types.is_object_dtype(names) or pd.api.types.is_string_dtype(names)):
+        return pd.Series([None] * len(names), index=names.index, dtype=object)
+    art = names.str.extract(ARTICLE_RE, expand=False)
+    return art.astype(object).where(art.notna(), None)
+
+
+def _str_view(s: pd.Series) -> pd.Series:
+    """
+    Колонка для .str-операцій без зайвої копії: object-колонку лише з рядків і
+    NaN/None віддаємо як є (.str сам пропускає пропуски), решту — через astype.
+    """
+    if pd.api.types.is_object_dtype(s) and pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty"):
+        return s
+    return s.astype("string")
+
+
+def _blank_mask(s: pd.Series) -> pd.Series:
+    """Порожні клітинки: NaN/None або рядок лише з пробілів (векторно)."""
+    return s.isna() | _str_view(s).str.strip().eq("").fillna(False).astype(bool)
+
+
 def _ensure_article_as_str(df: pd.DataFrame) -> pd.DataFrame:
     """
     Привести артикул до РЯДКА (щоб не загубити ведучі нулі).
@@ -216,22 +254,18 @@ def _ensure_article_as_str(df: pd.DataFrame) -> pd.DataFrame:
     """
     if "артикул" not in df.columns:
         return df
-    vals = []
-    for v in df["артикул"].tolist():
-        if v is None or (isinstance(v, float) and pd.isna(v)):
-            vals.append(None)
-            continue
-        s = str(v).strip()
-        # Артикул у нас стандартно 8 цифр, але інколи трапляються "00012345.0"
-        s = s.split(".")[0] if re.fullmatch(r"\d+(\.0+)?", s) else s
-        if re.fullmatch(r"\d{8}", s):
-            vals.append(s)
-        else:
-            vals.append(None)
-    df["артикул"] = pd.Series(vals, index=df.index)
+    # Артикул у нас стандартно 8 цифр, але інколи трапляються "00012345.0":
+    # один векторний regex-прохід замість циклу по рядках
+    art = _str_view(df["артикул"]).str.extract(_ARTICLE_CELL_RE, expand=False)
+    df["артикул"] = art.astype(object).where(art.notna(), None)
     return df
 
 
+def _float_array(s: pd.Series) -> np.ndarray:
+    """Колонка → float64-масив; нечислове/порожнє → NaN."""
+    return pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
 def _recompute_price_sum(df: pd.DataFrame) -> pd.DataFrame:
     """
     Добити відсутні "сума" та/або "ціна", якщо можемо.
@@ -248,20 +282,23 @@ def _recompute_price_sum(df: pd.DataFrame) -> pd.DataFrame:
     if not (has_qty or has_price or has_sum):
         return df
 
+    # Арифметика — на float64-масивах NumPy (NaN = відсутнє), без вирівнювання індексів
     if has_qty and has_price:
+        qty = _float_array(df["кількість"])
+        price = _float_array(df["ціна"])
         # сума, якщо відсутня
         if has_sum:
-            mask = df["сума"].isna() & df["кількість"].notna() & df["ціна"].notna()
-            df.loc[mask, "сума"] = df.loc[mask, "кількість"] * df.loc[mask, "ціна"]
+            total = _float_array(df["сума"])
+            df["сума"] = np.where(np.isnan(total), qty * price, total)
         else:
-            df["сума"] = df["кількість"] * df["ціна"]
+            df["сума"] = qty * price
             has_sum = True
 
     if has_qty and has_sum and not has_price:
-        mask = df["кількість"].notna() & (df["кількість"].astype(float) != 0) & df["сума"].notna()
-        price = pd.Series([None] * len(df), index=df.index, dtype="float64")
-        price.loc[mask] = df.loc[mask, "сума"] / df.loc[mask, "кількість"]
-        df["ціна"] = price
+        qty = _float_array(df["кількість"])
+        total = _float_array(df["сума"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df["ціна"] = np.where(qty != 0, total / qty, np.nan)
         has_price = True
 
     return df
@@ -292,8 +329,8 @@ def normalize_import_table(raw_df: pd.DataFrame) -> NormalizedImport:
         return NormalizedImport(df=pd.DataFrame(columns=CANON_ORDER), mapping_report={}, warnings=["Порожній файл."])
 
     # 1) Приберемо "порожні" рядки, де всі клітинки пусті/NaN
-    df = raw_df.copy()
-    df = df.dropna(how="all")
+    # dropna і так повертає новий DataFrame — окремий raw_df.copy() лише подвоював пам'ять
+    df = raw_df.dropna(how="all")
     if df.empty:
         return NormalizedImport(df=pd.DataFrame(columns=CANON_ORDER), mapping_report={}, warnings=["Усі рядки порожні."])
 
@@ -309,15 +346,11 @@ def normalize_import_table(raw_df: pd.DataFrame) -> NormalizedImport:
 
     # 3) Перейменування знайдених
     rename_map = {src: canon for canon, src in mapping.items() if src}
-    df = df.rename(columns=rename_map)
+    df.rename(columns=rename_map, inplace=True)  # df уже наш власний — без ще однієї копії
 
     # 4) Якщо немає "артикул", але є "назва" — спробуємо витягти
     if "артикул" not in df.columns and "назва" in df.columns:
-        articles: List[Optional[str]] = []
-        for name in df["назва"].tolist():
-            art = _extract_article_from_name(name)
-            articles.append(art)
-        df["артикул"] = pd.Series(articles, index=df.index)
+        df["артикул"] = _extract_articles_from_names(df["назва"])
         mapping_report.setdefault("артикул", "(витягнуто з «назва»)")
         warnings.append("Колонка «артикул» відсутня. Отримано з початку «назви» перші 8 цифр, де це вдалося.")
 
@@ -333,23 +366,30 @@ def normalize_import_table(raw_df: pd.DataFrame) -> NormalizedImport:
     df = _recompute_price_sum(df)
 
     # 8) Базова очистка: викинути рядки без "назва" і без "артикул" (тобто зовсім порожні товари)
-    def _is_blank(x) -> bool:
-        return x is None or (isinstance(x, float) and pd.isna(x)) or (isinstance(x, str) and x.strip() == "")
-
     keep_mask = ~(
-        (("назва" not in df.columns) or df["назва"].apply(_is_blank)) &
-        (("артикул" not in df.columns) or df["артикул"].apply(_is_blank))
+        (("назва" not in df.columns) or _blank_mask(df["назва"])) &
+        (("артикул" not in df.columns) or _blank_mask(df["артикул"]))
     )
     df = df.loc[keep_mask].copy()
 
-    # 9) Обрізати пробіли у назвах/групах
+    # 9) Обрізати пробіли у назвах/групах (лише рядкові значення; решту лишаємо як є)
+    # .str на object-колонці без жодного рядка (напр. числові коди груп + None) кидає
+    # AttributeError, тож спершу перевіряємо вміст, як у _str_view
     for col in ("назва", "група"):
-        if col in df.columns:
-            df[col] = df[col].apply(lambda v: v.strip() if isinstance(v, str) else v)
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if isinstance(s.dtype, pd.StringDtype):
+            df[col] = s.str.strip()
+        elif pd.api.types.is_object_dtype(s) and pd.api.types.infer_dtype(s, skipna=True) in (
+            "string", "mixed", "mixed-integer",
+        ):
+            df[col] = s.str.strip().combine_first(s)
 
     # 10) Порахувати прості метрики
     total_rows = int(len(df))
-    unique_articles = int(df["артикул"].dropna().astype(str).nunique()) if "артикул" in df.columns else 0
+    # Артикули вже рядки або None (крок з _ensure_article_as_str) — без astype(str)
+    unique_articles = int(df["артикул"].nunique()) if "артикул" in df.columns else 0
 
     stats = {
         "rows_total": float(total_rows),
@@ -13,8 +13,9 @@ used throughout the import and report handlers to ensure consistent data handlin
 Functions
 ---------
 
-read_any_spreadsheet(path: str) -> pandas.DataFrame
-    Read an input file into a ``pandas.DataFrame`` based on its extension.
+read_any_spreadsheet(path: str, use_arrow: bool = False) -> pandas.DataFrame
+    Read an input file into a ``pandas.DataFrame`` based on its contents,
+    optionally with pyarrow-backed columns.
 
 write_any_spreadsheet(df: pandas.DataFrame, path: str) -> None
     Write a ``pandas.DataFrame`` to disk using a format inferred from the
@@ -33,24 +34,138 @@ write_table(df: pandas.DataFrame, path: str, fmt: str = "xlsx", sheet_name: str
 
 from __future__ import annotations
 
+import codecs
+import csv
+import datetime as dt
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Iterable, Optional
+from xml.sax.saxutils import escape, quoteattr
 
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook, load_workbook
 
+# Optional: xlsxwriter streams .xlsx rows to disk (constant_memory mode)
+try:
+    import xlsxwriter  # type: ignore
+except ImportError:  # pragma: no cover
+    xlsxwriter = None
 
-def read_any_spreadsheet(path: str) -> pd.DataFrame:
+# Optional: pyarrow's C++ CSV writer (releases the GIL)
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.csv as pa_csv  # type: ignore
+except ImportError:  # pragma: no cover
+    pa = None
+    pa_csv = None
+
+# Optional: numba kernel for bulk parsing of very large text columns
+try:
+    from numba import njit, prange  # type: ignore
+except ImportError:  # pragma: no cover
+    njit = None
+    prange = range
+
+# One-pass cleanup for numeric text: drop every whitespace character (same set
+# as regex ``\s``, incl. NBSP/thin spaces used as thousand separators) and map
+# the decimal comma to a dot.
+_NUMERIC_TR = {cp: None for cp in range(0x3001) if chr(cp).isspace()}
+_NUMERIC_TR[ord(",")] = "."
+
+# Text columns at least this long are parsed by the numba kernel (if installed)
+_NUMBA_MIN_ROWS = 50_000
+
+# Several object columns with at least this many cells in total are coerced
+# in a thread pool (the numba kernel and parts of pd.to_numeric drop the GIL)
+_PARALLEL_MIN_CELLS = 200_000
+_COERCE_MAX_WORKERS = 8
+
+# How much of a file to sample when deciding whether it is delimited text
+_CSV_SNIFF_BYTES = 4096
+
+# Exact powers of ten for the kernel: mantissa / 10**k is correctly rounded
+# while the mantissa fits in 53 bits and k <= 22
+_POW10 = np.array([10.0 ** k for k in range(23)])
+_MAX_MANTISSA = (1 << 53) - 1
+
+
+@lru_cache(maxsize=256)
+def _ext_of(path: str) -> str:
+    """Lower-cased file suffix (``'.xlsx'``, ``'.csv'``, ...) for dispatching."""
+    return os.path.splitext(path)[1].lower()
+
+
+def _detect(path: str) -> str:
+    """Detect the spreadsheet kind from the file contents.
+
+    Returns ``'xlsx'``, ``'ods'`` or ``'csv'``, or ``''`` when the magic bytes
+    are inconclusive (the caller then falls back to the suffix). Results are
+    cached per ``(path, mtime, size)``, so a rewritten file is probed again.
+    """
+    st = os.stat(path)
+    return _detect_cached(str(path), st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=256)
+def _detect_cached(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as fh:
+        head = fh.read(_CSV_SNIFF_BYTES)
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as zf:
+                names = zf.namelist()
+        except zipfile.BadZipFile:
+            return ""
+        if "mimetype" in names:
+            return "ods"
+        if "[Content_Types].xml" in names and any(n.startswith("xl/") for n in names):
+            return "xlsx"
+        return ""
+    # Only UTF-8 text with a usual separator counts as delimited text; legacy
+    # .xls (OLE), PDF, JSON etc. fall through to the suffix dispatch
+    if _looks_like_csv(head):
+        return "csv"
+    return ""
+
+
+def _looks_like_csv(sample: bytes) -> bool:
+    """``True`` when ``sample`` decodes as UTF-8, is not JSON and contains
+    one of the separators ``,;\\t|``."""
+    if b"\x00" in sample:
+        return False
+    try:
+        # final=False: a multi-byte character cut off at the sample end is fine
+        text = codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    # JSON is valid UTF-8 full of commas, but not a table
+    if text.lstrip("\ufeff \t\r\n")[:1] in ("{", "["):
+        return False
+    return any(sep in text for sep in ",;\t|")
+
+
+def read_any_spreadsheet(path: str, use_arrow: bool = False) -> pd.DataFrame:
     """Read a spreadsheet file of various supported formats into a DataFrame.
 
     Supported extensions include Excel (.xlsx, .xlsm), OpenDocument Spreadsheet
-    (.ods) and Comma Separated Values (.csv). The correct pandas reader is
-    chosen based on the file suffix. For Excel and ODS files the appropriate
-    engine is selected automatically; if an engine is missing (e.g. ``odfpy``
-    for .ods files) a ``RuntimeError`` is raised.
+    (.ods) and Comma Separated Values (.csv). The correct reader is chosen
+    from the file's magic bytes, falling back to the file suffix. For Excel
+    and ODS files the appropriate engine is selected automatically; if an
+    engine is missing (e.g. ``odfpy`` for .ods files) a ``RuntimeError`` is
+    raised.
 
     Parameters
     ----------
     path : str
         Path to the spreadsheet file to read.
+    use_arrow : bool, optional
+        Return pyarrow-backed columns (``pd.ArrowDtype``) when pyarrow is
+        installed: strings live in contiguous UTF-8 buffers instead of Python
+        objects. Off by default because ``coerce_numeric_columns`` and the
+        import normaliser work on object columns.
 
     Returns
     -------
@@ -64,21 +179,116 @@ def read_any_spreadsheet(path: str) -> pd.DataFrame:
     RuntimeError
         If a required engine for reading the file type is not available.
     """
-    lower = path.lower()
-    if lower.endswith(('.xlsx', '.xlsm')):
-        # Excel formats using openpyxl engine
-        return pd.read_excel(path, engine='openpyxl')
-    if lower.endswith('.ods'):
+    # Contents first (temp uploads often have no suffix), the suffix as a fallback
+    kind = _detect(path) or _ext_of(path).lstrip('.')
+    use_arrow = use_arrow and pa is not None
+    if kind == 'csv':
+        return _read_csv(path, use_arrow=use_arrow)
+    if kind in ('xlsx', 'xlsm'):
+        # Excel formats: stream rows straight from openpyxl
+        df = _read_xlsx_read_only(path)
+    elif kind == 'ods':
         # OpenDocument Spreadsheet requires odfpy
         try:
-            return pd.read_excel(path, engine='odf')
+            df = pd.read_excel(path, engine='odf')
         except ImportError as exc:
             raise RuntimeError(
                 "Reading .ods files requires the optional dependency 'odfpy'."
             ) from exc
-    if lower.endswith('.csv'):
-        return pd.read_csv(path)
-    raise ValueError(f"Unsupported file extension: {path}")
+    else:
+        raise ValueError(f"Unsupported file extension: {path}")
+    return df.convert_dtypes(dtype_backend="pyarrow") if use_arrow else df
+
+
+def _sniff_delimiter(path: str, sample_size: int = 8192) -> str:
+    """Guess the CSV delimiter from the first ``sample_size`` bytes.
+
+    Only the usual spreadsheet separators are considered; anything the
+    sniffer cannot decide on falls back to a comma.
+    """
+    with open(path, "rb") as fh:
+        sample = fh.read(sample_size).decode("utf-8", errors="ignore")
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def _read_csv(path: str, use_arrow: bool = False) -> pd.DataFrame:
+    """Read a CSV file, using pyarrow's multithreaded parser when available.
+
+    By default the Arrow table is converted with numpy-backed dtypes so the
+    result looks the same as ``pd.read_csv`` output to the import pipeline;
+    ``use_arrow`` keeps the Arrow buffers (``pd.ArrowDtype`` columns).
+    """
+    delimiter = _sniff_delimiter(path)
+    if pa_csv is not None:
+        table = pa_csv.read_csv(str(path), parse_options=pa_csv.ParseOptions(delimiter=delimiter))
+        return table.to_pandas(types_mapper=pd.ArrowDtype) if use_arrow else table.to_pandas()
+    return pd.read_csv(path, sep=delimiter)
+
+
+def _unique_headers(header) -> list:
+    """Name columns the way ``pd.read_excel`` does: blanks become
+    ``Unnamed: <i>`` and repeated names get ``.1``, ``.2`` suffixes."""
+    seen: dict = {}
+    out = []
+    for i, name in enumerate(header):
+        if name is None or (isinstance(name, str) and not name.strip()):
+            name = f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        out.append(name)
+    return out
+
+
+def _read_xlsx_read_only(path: str) -> pd.DataFrame:
+    """Read the first worksheet of an .xlsx/.xlsm file via openpyxl read-only mode.
+
+    Rows are pulled with ``iter_rows(values_only=True)`` (plain tuples, no cell
+    objects) and handed to the DataFrame constructor in one go. Trailing empty
+    cells and rows are trimmed and the first row becomes the header, matching
+    ``pd.read_excel(path, engine='openpyxl')``.
+    """
+    rows = _xlsx_rows(path)
+    if not rows:
+        return pd.DataFrame()
+    width = max(len(r) for r in rows)
+    header = list(rows[0]) + [None] * (width - len(rows[0]))
+    data = [r + (None,) * (width - len(r)) if len(r) < width else r for r in rows[1:]]
+    return pd.DataFrame(data, columns=_unique_headers(header))
+
+
+def _xlsx_rows(path: str) -> list:
+    """Rows of the first worksheet with trailing empty cells and rows trimmed.
+
+    Not cached: uploads land on unique temp paths, so a cache would never be
+    hit again and would only keep parsed rows of deleted files in memory.
+    """
+    # A file object, not the path: openpyxl rejects names without an Excel
+    # suffix, and the kind has already been detected from the contents
+    with open(path, "rb") as fh:
+        wb = load_workbook(fh, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            # Some writers store a wrong <dimension>; let openpyxl scan the real extent
+            ws.reset_dimensions()
+            rows = []
+            last_nonempty = -1
+            for row in ws.iter_rows(values_only=True):
+                end = len(row)
+                while end and row[end - 1] is None:
+                    end -= 1
+                rows.append(row[:end])
+                if end:
+                    last_nonempty = len(rows) - 1
+            del rows[last_nonempty + 1:]
+        finally:
+            # read_only keeps the zip archive open until closed explicitly
+            wb.close()
+    return rows
 
 
 def write_any_spreadsheet(df: pd.DataFrame, path: str) -> None:
@@ -86,8 +296,8 @@ def write_any_spreadsheet(df: pd.DataFrame, path: str) -> None:
 
     The output format is determined by the extension of ``path``. Excel
     (.xlsx, .xlsm), OpenDocument Spreadsheet (.ods) and CSV (.csv) formats are
-    supported. The appropriate writer engine is selected automatically; for
-    writing .ods files a RuntimeError is raised if ``odfpy`` is not installed.
+    supported. The appropriate writer engine is selected automatically; .ods
+    files are streamed by a built-in writer and need no extra dependency.
 
     Parameters
     ----------
@@ -100,23 +310,17 @@ def write_any_spreadsheet(df: pd.DataFrame, path: str) -> None:
     ------
     ValueError
         If the extension is not recognised.
-    RuntimeError
-        If the engine required for writing the file type is not available.
     """
-    lower = path.lower()
-    if lower.endswith(('.xlsx', '.xlsm')):
-        df.to_excel(path, index=False, engine='openpyxl')
+    ext = _ext_of(path)
+    if ext in ('.xlsx', '.xlsm'):
+        # Write-only workbook directly, without pandas' ExcelWriter engine lookup
+        _write_xlsx_write_only(df, path)
         return
-    if lower.endswith('.ods'):
-        try:
-            df.to_excel(path, index=False, engine='odf')
-        except ImportError as exc:
-            raise RuntimeError(
-                "Writing .ods files requires the optional dependency 'odfpy'."
-            ) from exc
+    if ext == '.ods':
+        _write_ods_stream(df, path)
         return
-    if lower.endswith('.csv'):
-        df.to_csv(path, index=False)
+    if ext == '.csv':
+        _write_csv(df, path)
         return
     raise ValueError(f"Unsupported file extension: {path}")
 
@@ -145,33 +349,318 @@ def coerce_numeric_columns(df: pd.DataFrame, columns: Optional[Iterable[str]] =
         The same DataFrame with selected columns coerced to numeric where
         possible.
     """
+    # One comparison over the dtype array; typed frames (e.g. after an Arrow
+    # read) have nothing to convert
+    obj_mask = (df.dtypes == object).to_numpy()
+    if not obj_mask.any():
+        return df
+    obj_cols = df.columns[obj_mask]
     if columns is None:
-        target_cols = [col for col in df.columns if df[col].dtype == object]
+        target_cols = obj_cols.tolist()
     else:
-        target_cols = list(columns)
-
-    for col in target_cols:
-        # Skip non‑existent columns gracefully
-        if col not in df.columns:
-            continue
-        series = df[col]
-        # Only process object-like columns to avoid unintended conversions
-        if not pd.api.types.is_object_dtype(series):
-            continue
-        # Convert values to strings, remove whitespace and replace comma with dot
-        cleaned = (
-            series.astype(str)
-            .str.strip()
-            .str.replace(r"\s+", "", regex=True)
-            .str.replace(",", ".")
-        )
-        # Replace empty strings with NaN to allow numeric conversion
-        cleaned = cleaned.replace({"": pd.NA})
-        # Try to convert to numeric; invalid parsing will stay as string
-        df[col] = pd.to_numeric(cleaned, errors='ignore')
+        # Non-existent and non-object columns are skipped gracefully
+        wanted = set(obj_cols)
+        target_cols = [col for col in columns if col in wanted]
+
+    if len(target_cols) > 1 and len(df) * len(target_cols) >= _PARALLEL_MIN_CELLS:
+        with ThreadPoolExecutor(max_workers=min(_COERCE_MAX_WORKERS, len(target_cols))) as pool:
+            results = list(pool.map(_coerce_one, (df[col] for col in target_cols)))
+    else:
+        results = [_coerce_one(df[col]) for col in target_cols]
+
+    converted = [(col, res) for col, res in zip(target_cols, results) if res is not None]
+    if converted:
+        # One multi-column assignment instead of a setitem per column
+        names = [col for col, _ in converted]
+        df[names] = pd.concat([res for _, res in converted], axis=1, keys=names)
     return df
 
 
+def _coerce_one(series: pd.Series) -> Optional[pd.Series]:
+    """Numeric version of one object column, or ``None`` if some cell does not parse."""
+    is_text = pd.api.types.infer_dtype(series, skipna=True) == "string"
+    if is_text and _parse_numeric_bytes_nb is not None and len(series) >= _NUMBA_MIN_ROWS:
+        parsed = _parse_numeric_text(series)
+        if parsed is not None:
+            return _downcast_int(pd.Series(parsed, index=series.index))
+    if is_text:
+        # Pure text column (the common case for imports): translate the
+        # whole column at once and blank out empty cells with a mask
+        cleaned = series.str.translate(_NUMERIC_TR)
+        cleaned = cleaned.mask(cleaned.eq(""))
+    else:
+        # Mixed cells: single pass per cell; empty strings and missing
+        # values become NaN, other non-strings are passed through
+        cleaned = pd.Series([
+            (v.translate(_NUMERIC_TR) or np.nan) if isinstance(v, str)
+            else (np.nan if v is None or v is pd.NA else v)
+            for v in series.to_numpy()
+        ], index=series.index, dtype=object)
+    # Convert only if every cell parses; otherwise leave the column as is
+    try:
+        return _downcast_int(pd.to_numeric(cleaned))
+    except (ValueError, TypeError):
+        return None
+
+
+def _downcast_int(series: pd.Series) -> pd.Series:
+    """Shrink integer columns to the smallest int dtype that holds them.
+
+    Gap-free integer columns (quantities, months without movement) usually
+    fit int8/int16, which is 4-8x less memory than int64. Floats are left as
+    float64: float32 would round prices.
+    """
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    return series
+
+
+def _parse_numeric_bytes(offsets, buf, pow10, out, ints, status):  # pragma: no cover - compiled by numba
+    """Parse UTF-8 encoded cells ``buf[offsets[i]:offsets[i + 1]]`` into floats.
+
+    Mirrors ``str.translate(_NUMERIC_TR)`` followed by ``float()`` for plain
+    decimal notation: whitespace (ASCII and the common Unicode spaces used as
+    thousand separators) is skipped and ``,`` is a decimal point. ``status`` is
+    set to 1 for a parsed value, 0 for an empty cell and 2 for anything the
+    kernel does not handle (exponents, ``inf``, too many digits, garbage).
+    """
+    for i in prange(offsets.shape[0] - 1):
+        j = offsets[i]
+        end = offsets[i + 1]
+        neg = False
+        seen_sign = False
+        seen_dot = False
+        n_digits = 0
+        frac = 0
+        mant = 0
+        st = 1
+        while j < end:
+            b = int(buf[j])
+            if b == 32 or (9 <= b <= 13) or (28 <= b <= 31):
+                j += 1
+            elif b == 0xC2 and j + 1 < end and (buf[j + 1] == 0xA0 or buf[j + 1] == 0x85):
+                j += 2
+            elif b == 0xE2 and j + 2 < end and buf[j + 1] == 0x80 and (
+                0x80 <= buf[j + 2] <= 0x8A or buf[j + 2] == 0xA8 or buf[j + 2] == 0xA9 or buf[j + 2] == 0xAF
+            ):
+                j += 3
+            elif b == 0xE2 and j + 2 < end and buf[j + 1] == 0x81 and buf[j + 2] == 0x9F:
+                j += 3
+            elif b == 0xE3 and j + 2 < end and buf[j + 1] == 0x80 and buf[j + 2] == 0x80:
+                j += 3
+            elif b == 0xE1 and j + 2 < end and buf[j + 1] == 0x9A and buf[j + 2] == 0x80:
+                j += 3
+            elif 48 <= b <= 57:
+                if mant > (_MAX_MANTISSA - 9) // 10:
+                    st = 2
+                    break
+                mant = mant * 10 + (b - 48)
+                n_digits += 1
+                if seen_dot:
+                    frac += 1
+                j += 1
+            elif b == 44 or b == 46:
+                if seen_dot:
+                    st = 2
+                    break
+                seen_dot = True
+                j += 1
+            elif (b == 43 or b == 45) and not seen_sign and not seen_dot and n_digits == 0:
+                seen_sign = True
+                neg = b == 45
+                j += 1
+            else:
+                st = 2
+                break
+        if st == 1 and n_digits == 0:
+            st = 0 if not (seen_sign or seen_dot) else 2
+        if st == 1 and frac > 22:
+            st = 2
+        status[i] = st
+        if st == 1:
+            v = mant / pow10[frac]
+            out[i] = -v if neg else v
+            ints[i] = not seen_dot
+        else:
+            out[i] = np.nan
+            ints[i] = False
+    return out
+
+
+_parse_numeric_bytes_nb = (
+    njit(cache=True, nogil=True, parallel=True)(_parse_numeric_bytes) if njit is not None else None
+)
+
+
+def _parse_numeric_text(series: pd.Series) -> Optional[np.ndarray]:
+    """Parse an all-text column with the numba kernel.
+
+    Returns ``None`` when some non-empty cell is outside what the kernel
+    handles, so the caller can fall back to ``pd.to_numeric``. Integer-only
+    columns without gaps come back as ``int64``, like ``pd.to_numeric`` would
+    return them.
+    """
+    encoded = series.fillna("").str.encode("utf-8")
+    offsets = np.zeros(len(series) + 1, dtype=np.int64)
+    np.cumsum(encoded.str.len().to_numpy(dtype=np.int64), out=offsets[1:])
+    buf = np.frombuffer(b"".join(encoded.to_numpy()), dtype=np.uint8)
+    n = len(series)
+    out = np.empty(n, dtype=np.float64)
+    ints = np.empty(n, dtype=np.bool_)
+    status = np.empty(n, dtype=np.int8)
+    _parse_numeric_bytes_nb(offsets, buf, _POW10, out, ints, status)
+    if (status == 2).any():
+        return None
+    if (status == 1).all() and ints.all():
+        return out.astype(np.int64)
+    return out
+
+
+def _write_csv(df: pd.DataFrame, path, index: bool = False) -> None:
+    """Write a DataFrame to CSV, via ``pyarrow.csv.write_csv`` when available.
+
+    Frames Arrow cannot represent (e.g. object columns with mixed types) fall
+    back to ``DataFrame.to_csv``, which also handles the no-pyarrow case.
+    """
+    if pa_csv is not None:
+        try:
+            table = pa.Table.from_pandas(df.reset_index() if index else df, preserve_index=False)
+            pa_csv.write_csv(table, str(path), write_options=pa_csv.WriteOptions(include_header=True))
+            return
+        except (ValueError, TypeError, NotImplementedError):
+            # ArrowInvalid / ArrowTypeError / ArrowNotImplementedError
+            pass
+    df.to_csv(path, index=index)
+
+
+_ODS_MIMETYPE = "application/vnd.oasis.opendocument.spreadsheet"
+
+_ODS_MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0"'
+    ' manifest:version="1.2">'
+    f'<manifest:file-entry manifest:full-path="/" manifest:version="1.2" manifest:media-type="{_ODS_MIMETYPE}"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+
+_ODS_CONTENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<office:document-content'
+    ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+    ' xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+    ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+    ' office:version="1.2"><office:body><office:spreadsheet>'
+)
+
+_ODS_CONTENT_TAIL = '</table:table></office:spreadsheet></office:body></office:document-content>'
+
+
+def _ods_cell(value) -> str:
+    """Render one value as a ``<table:table-cell>`` element."""
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return "<table:table-cell/>"
+    if isinstance(value, (bool, np.bool_)):
+        flag = "true" if value else "false"
+        return (
+            f'<table:table-cell office:value-type="boolean" office:boolean-value="{flag}">'
+            f"<text:p>{flag.upper()}</text:p></table:table-cell>"
+        )
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        # Plain Python numbers: NumPy 2 scalars repr as "np.float64(...)"
+        value = int(value) if isinstance(value, (int, np.integer)) else float(value)
+        return (
+            f'<table:table-cell office:value-type="float" office:value="{value!r}">'
+            f"<text:p>{value}</text:p></table:table-cell>"
+        )
+    if isinstance(value, (dt.datetime, dt.date)):
+        iso = value.isoformat()
+        return (
+            f'<table:table-cell office:value-type="date" office:date-value="{iso}">'
+            f"<text:p>{iso}</text:p></table:table-cell>"
+        )
+    return f'<table:table-cell office:value-type="string"><text:p>{escape(str(value))}</text:p></table:table-cell>'
+
+
+def _write_ods_stream(df: pd.DataFrame, path, sheet_name: str = "Sheet1", index: bool = False) -> None:
+    """Write a DataFrame as a single-sheet .ods without building an XML tree.
+
+    ``content.xml`` is streamed into the zip archive row by row, so neither
+    the odfpy DOM nor a list copy of the frame is materialised.
+    """
+    if index:
+        df = df.reset_index()
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        # The mimetype entry must come first and be stored uncompressed
+        zf.writestr(zipfile.ZipInfo("mimetype"), _ODS_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/manifest.xml", _ODS_MANIFEST)
+        with zf.open("content.xml", "w") as out:
+            out.write(_ODS_CONTENT_HEAD.encode("utf-8"))
+            out.write(f"<table:table table:name={quoteattr(str(sheet_name))}>".encode("utf-8"))
+            header = "".join(_ods_cell(str(c)) for c in df.columns)
+            out.write(f"<table:table-row>{header}</table:table-row>".encode("utf-8"))
+            for row in df.itertuples(index=False, name=None):
+                cells = "".join(_ods_cell(v) for v in row)
+                out.write(f"<table:table-row>{cells}</table:table-row>".encode("utf-8"))
+            out.write(_ODS_CONTENT_TAIL.encode("utf-8"))
+
+
+def _data_rows(df: pd.DataFrame) -> Iterable[tuple]:
+    """Yield the rows of ``df`` as plain tuples with missing values as ``None``.
+
+    ``itertuples(name=None)`` avoids building a Series per row, and NaN/NaT/NA
+    are replaced while each cell is visited anyway, instead of an
+    ``astype(object).where(notna)`` copy of the whole frame beforehand.
+    """
+    rows = df.itertuples(index=False, name=None)
+    if not df.isna().to_numpy().any():
+        yield from rows
+        return
+    for row in rows:
+        yield tuple(
+            None if v is None or v is pd.NaT or v is pd.NA or (isinstance(v, float) and v != v) else v
+            for v in row
+        )
+
+
+def _write_xlsx_write_only(df: pd.DataFrame, path, sheet_name: str = "Sheet1", index: bool = False) -> None:
+    """Write an unstyled DataFrame through a streaming xlsx writer.
+
+    Unlike ``DataFrame.to_excel`` this skips the per-cell style handling and
+    streams rows into the sheet. For .xlsx files xlsxwriter in
+    ``constant_memory`` mode is preferred: each row is flushed to disk once the
+    next one starts, so rows cannot be rewritten later, which is fine for a
+    single top-to-bottom pass. Without xlsxwriter (and for .xlsm, which it
+    cannot produce without a VBA project) an openpyxl write-only workbook is
+    used. Missing values are written as empty cells.
+    """
+    if index:
+        df = df.reset_index()
+    rows = _data_rows(df)
+
+    if xlsxwriter is not None and _ext_of(os.fspath(path)) == ".xlsx":
+        xwb = xlsxwriter.Workbook(str(path), {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            "remove_timezone": True,
+        })
+        try:
+            xws = xwb.add_worksheet(sheet_name)
+            xws.write_row(0, 0, [str(c) for c in df.columns])
+            for r, row in enumerate(rows, start=1):
+                xws.write_row(r, 0, row)
+        finally:
+            xwb.close()
+        return
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    ws.append([str(c) for c in df.columns])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
 def write_table(
     df: pd.DataFrame,
     path: str,
@@ -199,29 +688,22 @@ def write_table(
     ------
     ValueError
         If the provided format is not supported.
-    RuntimeError
-        If writing ODS files is requested but the required engine is not installed.
     """
     ext = fmt.lower().lstrip(".")
     # Accept both xlsx and xlsm as Excel formats
     if ext not in ("xlsx", "xlsm", "ods", "csv"):
         raise ValueError(f"Unsupported format: {fmt}")
     # Determine full output path with correct suffix
-    from pathlib import Path
-    output_path = Path(path).with_suffix(f".{ext}")
+    # os.path.splitext instead of pathlib: no Path objects on this hot path
+    output_path = f"{os.path.splitext(path)[0]}.{ext}"
     # Excel formats
     if ext in ("xlsx", "xlsm"):
-        df.to_excel(output_path, index=index, engine='openpyxl', sheet_name=sheet_name)
+        _write_xlsx_write_only(df, output_path, sheet_name=sheet_name, index=index)
         return
     # OpenDocument Spreadsheet
     if ext == "ods":
-        try:
-            df.to_excel(output_path, index=index, engine='odf', sheet_name=sheet_name)
-        except ImportError as exc:
-            raise RuntimeError(
-                "Writing .ods files requires the optional dependency 'odfpy'."
-            ) from exc
+        _write_ods_stream(df, output_path, sheet_name=sheet_name, index=index)
         return
     # CSV
-    df.to_csv(output_path, index=index)
+    _write_csv(df, output_path, index=index)
     return
\ No newline at end of file
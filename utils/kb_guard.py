@@ -27,18 +27,29 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from dataclasses import dataclass
-from typing import Optional
+import os
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional
 
 from aiogram import BaseMiddleware, Dispatcher
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from cachetools import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# (chat_id, message_id) -> (підпис показаного вмісту, Message) для safe_edit_or_send
+_LAST_EDIT: "LRUCache[tuple, tuple[int, Message]]" = LRUCache(maxsize=8192)
+
 
 # ---------------------------- Fallback-клавіатура -----------------------------
 
+@lru_cache(maxsize=1)
 def _fallback_kb() -> InlineKeyboardMarkup:
     """
     Мінімальна клавіатура, щоб користувач не застряг без варіантів.
@@ -46,6 +57,12 @@ def _fallback_kb() -> InlineKeyboardMarkup:
     Кнопки слід адаптувати під ваші callback_data. За замовчуванням
     пропонується кнопка повернення на головний екран і відкриття
     персонального списку користувача.
+
+    Розмітка незмінна, тож будується (з pydantic-валідацією) один раз
+    і далі спільна для всіх викликів — Bot API її лише серіалізує.
+    Готовий JSON-рядок замість об'єкта aiogram 3.x не приймає: поле
+    ``reply_markup`` методів валідується як модель, а обхід через
+    ``model_construct`` залежав би від внутрішньої серіалізації сесії.
     """
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -56,8 +73,118 @@ def _fallback_kb() -> InlineKeyboardMarkup:
     return kb
 
 
+# ------------------------- Черга вихідних запитів на чат ---------------------
+# Telegram радить не більше ~1 повідомлення/с в один чат; сплески вище ліміту
+# закінчуються 429 і вимушеною паузою. Тому send/edit з safe_edit_or_send ідуть
+# через чергу чату з token bucket, а кілька редагувань того самого повідомлення,
+# що ще чекають у черзі, зливаються в одне (надсилається останнє).
+
+# Швидкість (запитів/с) і допустимий сплеск на один чат
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1") or 1)
+TG_CHAT_BURST = 3
+# Скільки разів повторювати запит після TelegramRetryAfter
+_RETRY_ATTEMPTS = 3
+
+
+@dataclass
+class _OutItem:
+    op: str
+    kwargs: Dict[str, Any]
+    futures: List[asyncio.Future] = field(default_factory=list)
+
+
+@dataclass
+class _ChatOutbox:
+    queue: Deque[_OutItem] = field(default_factory=deque)
+    pending_edits: Dict[int, _OutItem] = field(default_factory=dict)
+    tokens: float = TG_CHAT_BURST
+    stamp: float = 0.0
+    task: Optional[asyncio.Task] = None
+
+
+# Стан bucket-а живе й між сплесками; давно неактивні чати витісняються
+_OUTBOXES: "LRUCache[Any, _ChatOutbox]" = LRUCache(maxsize=10_000)
+
+
+async def _take_token(box: _ChatOutbox) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        now = loop.time()
+        box.tokens = min(TG_CHAT_BURST, box.tokens + (now - box.stamp) * TG_CHAT_RATE)
+        box.stamp = now
+        if box.tokens >= 1.0:
+            box.tokens -= 1.0
+            return
+        await asyncio.sleep((1.0 - box.tokens) / TG_CHAT_RATE)
+
+
+async def _call_with_retry(bot, item: _OutItem):
+    for attempt in range(_RETRY_ATTEMPTS + 1):
+        try:
+            return await getattr(bot, item.op)(**item.kwargs)
+        except TelegramRetryAfter as e:
+            if attempt == _RETRY_ATTEMPTS:
+                raise
+            # Джитер, щоб чати після спільної паузи не вдарили в API одночасно
+            await asyncio.sleep(e.retry_after * random.uniform(1.0, 1.5))
+
+
+async def _drain(bot, box: _ChatOutbox) -> None:
+    while box.queue:
+        item = box.queue.popleft()
+        if item.op == "edit_message_text":
+            # Далі редагування цього повідомлення стають у чергу окремо
+            box.pending_edits.pop(item.kwargs["message_id"], None)
+        await _take_token(box)
+        try:
+            result = await _call_with_retry(bot, item)
+        except Exception as e:
+            for f in item.futures:
+                if not f.done():
+                    f.set_exception(e)
+        else:
+            for f in item.futures:
+                if not f.done():
+                    f.set_result(result)
+
+
+async def _tg_send(bot, chat_id: int | str, op: str, kwargs: Dict[str, Any]):
+    """
+    Виконати ``bot.<op>(**kwargs)`` через чергу чату: з обмеженням швидкості,
+    повтором після Retry-After і злиттям редагувань одного повідомлення.
+    """
+    box = _OUTBOXES.get(chat_id)
+    if box is None:
+        box = _OUTBOXES[chat_id] = _ChatOutbox(stamp=asyncio.get_running_loop().time())
+    fut = asyncio.get_running_loop().create_future()
+
+    item = box.pending_edits.get(kwargs["message_id"]) if op == "edit_message_text" else None
+    if item is not None:
+        # Попереднє редагування ще не пішло — замінюємо його новішим
+        item.kwargs = kwargs
+        item.futures.append(fut)
+    else:
+        item = _OutItem(op, kwargs, [fut])
+        if op == "edit_message_text":
+            box.pending_edits[kwargs["message_id"]] = item
+        box.queue.append(item)
+        if box.task is None or box.task.done():
+            box.task = asyncio.create_task(_drain(bot, box))
+    return await fut
+
+
 # ------------------------------- safe_edit_or_send ----------------------------
 
+def _edit_signature(text: str, parse_mode, reply_markup, disable_web_page_preview) -> int:
+    markup = reply_markup.model_dump_json() if reply_markup is not None else ""
+    return hash((text, parse_mode, markup, disable_web_page_preview))
+
+
+def forget_edited_message(chat_id: int | str, message_id: int) -> None:
+    """Забути запам'ятований вміст повідомлення (його змінили/видалили поза safe_edit_or_send)."""
+    _LAST_EDIT.pop((chat_id, message_id), None)
+
+
 async def safe_edit_or_send(
     bot,
     chat_id: int | str,
@@ -80,31 +207,46 @@ async def safe_edit_or_send(
     Усі відповіді завжди мають клавіатуру: якщо ``reply_markup`` не
     передано, використовується ``_fallback_kb()``. Це запобігає ситуації,
     коли користувач не має кнопок для навігації.
+
+    Якщо повідомлення вже показує той самий текст і клавіатуру (останнє
+    редагування/відправка пройшли тут), запит у Telegram не робиться взагалі —
+    повертається збережений Message. Зміни повідомлення в обхід цієї функції
+    скидає RenderCacheMiddleware (forget_edited_message).
     """
     if reply_markup is None:
         reply_markup = _fallback_kb()
+    signature = _edit_signature(text, parse_mode, reply_markup, disable_web_page_preview)
 
     if message_id:
+        cached = _LAST_EDIT.get((chat_id, message_id))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
         try:
-            return await bot.edit_message_text(
+            msg = await _tg_send(bot, chat_id, "edit_message_text", dict(
                 chat_id=chat_id,
                 message_id=message_id,
                 text=text,
                 parse_mode=parse_mode,
                 reply_markup=reply_markup,
                 disable_web_page_preview=disable_web_page_preview,
-            )
+            ))
         except Exception as e:
             # Редагування часто падає для повідомлень з медіа або якщо текст не змінився
             logger.debug("safe_edit_or_send: edit_message_text failed, falling back to send_message: %s", e)
+        else:
+            if isinstance(msg, Message):
+                _LAST_EDIT[(chat_id, message_id)] = (signature, msg)
+            return msg
 
-    return await bot.send_message(
+    msg = await _tg_send(bot, chat_id, "send_message", dict(
         chat_id=chat_id,
         text=text,
         parse_mode=parse_mode,
         reply_markup=reply_markup,
         disable_web_page_preview=disable_web_page_preview,
-    )
+    ))
+    _LAST_EDIT[(chat_id, msg.message_id)] = (signature, msg)
+    return msg
 
 
 # ------------------------------ Middleware-аудит ------------------------------
@@ -118,6 +260,7 @@ class _KbAuditConfig:
 class KbAuditMiddleware(BaseMiddleware):
     """
     Middleware для перехоплення CallbackQuery та гарантування наявності клавіатури.
+    Реєструється лише на ``dp.callback_query`` — інших подій не отримує.
 
     Після виконання хендлера перевіряє, чи повідомлення, пов'язане з
     callback, має клавіатуру. Якщо ні, логуватиме попередження і, за
@@ -128,30 +271,36 @@ class KbAuditMiddleware(BaseMiddleware):
     def __init__(self, config: Optional[_KbAuditConfig] = None):
         super().__init__()
         self.config = config or _KbAuditConfig()
+        # Прапорець читаємо один раз, а не через self.config на кожен callback
+        self._enforce_fallback = self.config.enforce_fallback
 
-    async def __call__(self, handler, event, data):
-        # Викликаємо хендлер спочатку
+    async def __call__(self, handler, event: CallbackQuery, data):
+        # Тип події гарантує observer dp.callback_query (див. install_kb_audit)
         result = await handler(event, data)
-        # Після обробки: якщо це CallbackQuery — перевіряємо наявність клавіатури
+        # Після обробки перевіряємо наявність клавіатури
         try:
-            if isinstance(event, CallbackQuery):
-                msg: Optional[Message] = event.message
-                if msg and (msg.reply_markup is None or not getattr(msg.reply_markup, "inline_keyboard", None)):
-                    logger.warning(
-                        "KbAudit: повідомлення без клавіатури після callback '%s'", event.data
+            msg: Optional[Message] = event.message
+            if msg and (msg.reply_markup is None or not getattr(msg.reply_markup, "inline_keyboard", None)):
+                logger.warning(
+                    "KbAudit: повідомлення без клавіатури після callback '%s'", event.data
+                )
+                if self._enforce_fallback:
+                    # Ack callback і правка markup незалежні — один round-trip замість двох.
+                    # Повторний ack (якщо хендлер уже відповів) лише поверне помилку.
+                    _, edited = await asyncio.gather(
+                        event.answer(),
+                        msg.edit_reply_markup(reply_markup=_fallback_kb()),
+                        return_exceptions=True,
                     )
-                    if self.config.enforce_fallback:
+                    if isinstance(edited, BaseException):
+                        # Якщо редагувати не можна, намагаємося відповісти новим повідомленням
                         try:
-                            await event.message.edit_reply_markup(reply_markup=_fallback_kb())
+                            await msg.answer(
+                                "Оновлено навігацію:", reply_markup=_fallback_kb()
+                            )
                         except Exception:
-                            # Якщо редагувати не можна, намагаємося відповісти новим повідомленням
-                            try:
-                                await event.message.answer(
-                                    "Оновлено навігацію:", reply_markup=_fallback_kb()
-                                )
-                            except Exception:
-                                # У крайніх випадках ігноруємо
-                                pass
+                            # У крайніх випадках ігноруємо
+                            pass
         except Exception as e:
             logger.debug("KbAudit post-hook error: %s", e)
         return result
@@ -165,12 +314,10 @@ def require_kb(fn):
 
     У версії 3.x aiogram змінилося API для клавіатур. Деякий код ще може
     викликати ``@require_kb`` для контролю наявності клавіатури. Щоб не
-    ламати підписів функцій, ми повертаємо обгортку, яка викликає
-    оригінальну функцію без додаткових перевірок.
+    ламати підписів функцій, повертаємо саму функцію без змін — без
+    зайвої обгортки та додаткового await на кожен виклик.
     """
-    async def wrapper(*args, **kwargs):
-        return await fn(*args, **kwargs)
-    return wrapper
+    return fn
 
 
 # ------------------------------ Підключення ----------------------------------
@@ -191,4 +338,7 @@ def install_kb_audit(dp: Dispatcher, *, enforce_fallback: bool = True) -> None:
         Якщо True, middleware примусово додає fallback‑клавіатуру при її
         відсутності. Якщо False, лише логуватиме попередження.
     """
-    dp.update.middleware(KbAuditMiddleware(_KbAuditConfig(enforce_fallback=enforce_fallback)))
\ No newline at end of file
+    # Реєструємо на callback_query, а не на update: middleware бачить лише
+    # callback-и (на рівні update подією був би Update, і аудит не спрацьовував би),
+    # а повідомлення та інші апдейти взагалі не проходять через нього
+    dp.callback_query.middleware(KbAuditMiddleware(_KbAuditConfig(enforce_fallback=enforce_fallback)))
\ No newline at end of file
@@ -1,11 +1,16 @@
 import re
 
+# Для parse_mode="Markdown" потрібно екранувати лише ці символи
+_ESCAPE_RE = re.compile(r"([*_`\[])")
+
+
 def escape_markdown(text: str) -> str:
     """
     Екранує спеціальні символи для старого Markdown, який використовується в боті.
     """
     if not isinstance(text, str):
         text = str(text)
-    # Для parse_mode="Markdown" потрібно екранувати лише ці символи
-    escape_chars = r"([*_`\[])"
-    return re.sub(escape_chars, r"\\\1", text)
\ No newline at end of file
+    # Числа (кількості, суми) не містять спецсимволів — повертаємо як є
+    if text and text.replace(".", "", 1).replace("-", "", 1).isdigit():
+        return text
+    return _ESCAPE_RE.sub(r"\\\1", text)
@@ -3,67 +3,76 @@
 Рендерери UI-пейлоадів (без Telegram-залежностей).
 
 render_product_card(session, dept_id, article) -> (card_json: dict, file_id: Optional[str])
+
+Кешування тут навмисно немає: рендерер викликається лише через
+utils.card_cache (L1 у пам'яті процесу + L2 у БД, single-flight), тобто вже
+після промаху обох рівнів — найчастіше одразу після invalidate. Ще один TTL-кеш
+на цьому рівні віддавав би саме застарілі дані, які щойно інвалідовано.
 """
 
 from __future__ import annotations
 from typing import Optional, Tuple
 
+from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 
 from database.orm.products import Product, ProductPhoto  # type: ignore
 
-def _pick_approved_photo(session: Session, dept_id: str, article: str) -> Optional[str]:
-    """
-    Взяти file_id першого схваленого фото, якщо є. Повертає None, якщо немає.
-    """
-    # Якщо у тебе інший спосіб вибору — підправ нижче.
-    q = session.query(ProductPhoto).filter(
-        ProductPhoto.dept_id == str(dept_id),
-        ProductPhoto.article == str(article),
-        ProductPhoto.status == "approved"
-    ).order_by(ProductPhoto.order_no.asc())
-    row = q.first()
-    return row.file_id if row else None
+# Шаблон картки для відсутнього артикулу; на виклик лише підставляємо ключ
+_NOT_FOUND_CARD = {
+    "title": "Товар не знайдено",
+    "subtitle": "",
+    "available": 0.0,
+    "price": 0.0,
+    "can_add": False,
+    "note": "Цей артикул відсутній у довіднику.",
+}
+
 
 def render_product_card(session: Session, dept_id: str, article: str) -> Tuple[dict, Optional[str]]:
     """
     Зібрати payload картки товару. Не стосується Telegram безпосередньо.
     Повертає card_json і, за наявності, file_id фото для відправки.
+
+    card_json — плаский dict лише з JSON-типами; необов'язкові ключі (note)
+    присутні тільки зі значенням, тож серіалізатор не пише зайвих null.
     """
-    p = session.query(Product).filter(
-        Product.dept_id == str(dept_id),
-        Product.article == str(article)
-    ).one_or_none()
+    # Один раз приводимо ключ до рядків; рядок із БД має ті самі значення (рівність у WHERE)
+    dept_id = str(dept_id)
+    article = str(article)
+
+    # Товар і перше схвалене фото — одним запитом (LEFT JOIN + LIMIT 1)
+    stmt = (
+        select(Product.name, Product.qty, Product.price, ProductPhoto.file_id)
+        .outerjoin(ProductPhoto, and_(
+            ProductPhoto.dept_id == Product.dept_id,
+            ProductPhoto.article == Product.article,
+            ProductPhoto.status == "approved",
+        ))
+        .where(Product.dept_id == dept_id, Product.article == article)
+        .order_by(ProductPhoto.order_no.asc())
+        .limit(1)
+    )
+    p = session.execute(stmt).first()
 
     if not p:
         # Мінімальний payload на випадок відсутності
-        return ({
-            "dept_id": str(dept_id),
-            "article": str(article),
-            "title": "Товар не знайдено",
-            "subtitle": "",
-            "available": 0.0,
-            "price": 0.0,
-            "can_add": False,
-            "note": "Цей артикул відсутній у довіднику."
-        }, None)
+        return {"dept_id": dept_id, "article": article, **_NOT_FOUND_CARD}, None
 
-    title = f"{p.article} • {p.name}".strip()
-    subtitle = f"Відділ {p.dept_id}"
+    title = f"{article} • {p.name}".strip()
+    subtitle = f"Відділ {dept_id}"
     available = float(p.qty or 0.0)
     price = float(p.price or 0.0)
 
     card_json = {
-        "dept_id": str(p.dept_id),
-        "article": str(p.article),
+        "dept_id": dept_id,
+        "article": article,
         "title": title,
         "subtitle": subtitle,
         "available": available,
         "price": price,
         "can_add": bool(available > 0.0),
-        "note": None
     }
 
-    # Фото: беремо схвалене або None
-    file_id = _pick_approved_photo(session, str(p.dept_id), str(p.article))
-    return card_json, file_id
+    # Фото: схвалене з JOIN або None
+    return card_json, p.file_id
@@ -16,21 +16,29 @@
 - Для зображень перед збереженням використовуй utils.image_opt.optimize_*.
 - Для публічної роздачі (якщо знадобиться) тримай MEDIA_ROOT за reverse-proxy.
 
-ПРИМІТКА: модуль синхронний. Всередині aiogram 3.x викликай у thread-пулі, якщо обсяги великі.
+ПРИМІТКА: базові функції синхронні. З хендлерів aiogram 3.x використовуй async-варіанти
+(asave_bytes, aread_bytes, adelete_file, acleanup_old) — вони виконують I/O у thread-пулі,
+не блокуючи event loop.
 """
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import datetime as dt
 import hashlib
 import os
+import re
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional
 
 from dotenv import load_dotenv
 
-load_dotenv(override=True)
+# .env уже завантажує точка входу (config.py); тут — лише якщо модуль імпортовано окремо
+if not os.getenv("MEDIA_ROOT"):
+    load_dotenv()
 
 MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", "media")).resolve()
 MEDIA_RETENTION_DAYS = int(os.getenv("MEDIA_RETENTION_DAYS", "90") or 0)
@@ -41,12 +49,30 @@ MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
 
 # ------------------------------- Утиліти --------------------------------------
 
-def _now_str() -> str:
-    return dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+_WS_RE = re.compile(r"\s+")
+_BAD_RE = re.compile(r"[^A-Za-z0-9_\-\.]+")
 
 
-def _sha256(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+def _now_str(now: Optional[dt.datetime] = None) -> str:
+    return (now or dt.datetime.now()).strftime("%Y%m%d_%H%M%S")
+
+
+# Розмір шматка для суміщеного гешування й запису: байти ще «гарячі» в кеші CPU
+_WRITE_CHUNK = 1 << 20
+
+
+def _write_hashed(f: BinaryIO, data: bytes) -> str:
+    """
+    Записати байти у файл і паралельно порахувати sha256 — один прохід по
+    даних шматками по 1 МіБ замість окремих проходів «геш» і «запис».
+    """
+    h = hashlib.sha256(usedforsecurity=False)
+    view = memoryview(data)
+    for start in range(0, len(view), _WRITE_CHUNK):
+        chunk = view[start:start + _WRITE_CHUNK]
+        h.update(chunk)
+        f.write(chunk)
+    return h.hexdigest()
 
 
 def _safe_segment(s: str) -> str:
@@ -54,13 +80,27 @@ def _safe_segment(s: str) -> str:
     Безпечний сегмент шляху: тільки букви/цифри/дефіс/підкреслення.
     Пробіли → підкреслення, решту відкидаємо.
     """
-    import re
     s = (s or "").strip()
-    s = re.sub(r"\s+", "_", s)
-    s = re.sub(r"[^A-Za-z0-9_\-\.]+", "", s)
+    s = _WS_RE.sub("_", s)
+    s = _BAD_RE.sub("", s)
     return s or "x"
 
 
+# грубий мапінг популярних MIME
+_MIME_EXT = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/webp": "webp",
+    "image/png": "png",
+    "application/zip": "zip",
+    "application/x-zip-compressed": "zip",
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "application/vnd.oasis.opendocument.spreadsheet": "ods",
+}
+
+
 def _ext_for(mime_or_hint: Optional[str], default_ext: str = "bin") -> str:
     """
     Вгадати розширення. Якщо hint має вигляд 'image/jpeg' або '.jpg' — повернемо доречне.
@@ -70,27 +110,12 @@ def _ext_for(mime_or_hint: Optional[str], default_ext: str = "bin") -> str:
         return default_ext
     if hint.startswith("."):
         return hint.lstrip(".")
-    # грубий мапінг популярних MIME
-    if hint in ("image/jpeg", "image/jpg"):
-        return "jpg"
-    if hint in ("image/webp",):
-        return "webp"
-    if hint in ("image/png",):
-        return "png"
-    if hint in ("application/zip", "application/x-zip-compressed"):
-        return "zip"
-    if hint in ("text/csv", "application/csv"):
-        return "csv"
-    if hint in ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",):
-        return "xlsx"
-    if hint in ("application/vnd.oasis.opendocument.spreadsheet",):
-        return "ods"
-    return default_ext
+    return _MIME_EXT.get(hint, default_ext)
 
 
 # ------------------------------- Дані-відповідь -------------------------------
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StoredFile:
     """
     Результат збереження файлу.
@@ -102,8 +127,8 @@ class StoredFile:
 
     def as_dict(self) -> dict:
         return {
-            "path": str(self.path),
-            "rel_path": str(self.rel_path),
+            "path": self.path.__fspath__(),
+            "rel_path": self.rel_path.__fspath__(),
             "size": self.size,
             "sha256": self.sha256,
         }
@@ -131,6 +156,7 @@ def save_bytes(
     user_id: Optional[str] = None,
     ext_hint: Optional[str] = None,
     prefix: Optional[str] = None,
+    sha256: Optional[str] = None,
 ) -> StoredFile:
     """
     Зберегти масив байтів у файлову систему.
@@ -143,11 +169,16 @@ def save_bytes(
 
     Повертає StoredFile з абсолютним шляхом та відносним.
 
+    sha256 — уже порахований геш цих байтів (напр., з utils.image_opt), щоб не
+    гешувати ще раз. Без нього геш рахується разом із записом, одним проходом.
+
     ПРИКЛАД:
         save_bytes(img_bytes, category="photos", dept_id="100", article="12345678", ext_hint="jpg")
     """
-    year = dt.datetime.now().strftime("%Y")
-    month = dt.datetime.now().strftime("%m")
+    # Один знімок часу на все збереження: рік/місяць каталогу й мітка в імені узгоджені
+    now = dt.datetime.now()
+    year = f"{now.year:04d}"
+    month = f"{now.month:02d}"
 
     # Базовий сегмент: відділ або користувач або 'common'
     base_seg = _safe_segment(dept_id or user_id or "common")
@@ -156,19 +187,31 @@ def save_bytes(
         subdir_parts.append(_safe_segment(article))
     folder = ensure_subdir(*subdir_parts)
 
-    sha = _sha256(data)
     ext = _ext_for(ext_hint, default_ext="bin")
-    ts = _now_str()
+    ts = _now_str(now)
     name_prefix = _safe_segment(prefix or category or "file")
 
-    filename = f"{name_prefix}_{ts}_{sha[:8]}.{ext}"
-    full_path = folder / filename
-
-    with open(full_path, "wb") as f:
-        f.write(data)
+    # Пишемо в тимчасовий файл і лише потім даємо йому ім'я: недописаний файл
+    # ніколи не з'явиться під постійним ім'ям. Заодно ім'я може залежати від
+    # гешу, який стає відомим тільки після запису.
+    tmp = folder / f".{os.urandom(6).hex()}.tmp"
+    try:
+        with open(tmp, "xb") as f:
+            if sha256:
+                f.write(data)
+                sha = sha256
+            else:
+                sha = _write_hashed(f, data)
+        full_path = folder / f"{name_prefix}_{ts}_{sha[:8]}.{ext}"
+        # Той самий каталог — rename атомарний
+        os.replace(tmp, full_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
 
     rel_path = full_path.relative_to(MEDIA_ROOT)
-    return StoredFile(path=full_path, rel_path=rel_path, size=full_path.stat().st_size, sha256=sha)
+    return StoredFile(path=full_path, rel_path=rel_path, size=len(data), sha256=sha)
 
 
 def read_bytes(rel_path: str | Path) -> bytes:
@@ -206,18 +249,52 @@ def cleanup_old(category: Optional[str] = None, retention_days: int = MEDIA_RETE
     if not base.exists():
         return 0
 
-    now = dt.datetime.now()
+    # Один поріг на весь прохід. «Старше N днів» як і раніше означає повних
+    # днів > N, тобто вік ≥ (N + 1) діб
+    cutoff = time.time() - (retention_days + 1) * 86400
     removed = 0
 
-    for p in base.rglob("*"):
+    # os.scandir без рекурсії через Path: тип запису береться з readdir,
+    # stat — один на файл, DirEntry замість Path-об'єктів
+    stack = [str(base)]
+    while stack:
         try:
-            if not p.is_file():
-                continue
-            mtime = dt.datetime.fromtimestamp(p.stat().st_mtime)
-            if (now - mtime).days > retention_days:
-                p.unlink(missing_ok=True)
-                removed += 1
-        except Exception:
+            it = os.scandir(stack.pop())
+        except OSError:
             continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file(follow_symlinks=False) and e.stat(follow_symlinks=False).st_mtime <= cutoff:
+                        os.unlink(e.path)
+                        removed += 1
+                except OSError:
+                    continue
 
     return removed
+
+
+# ------------------------------ Async-обгортки --------------------------------
+# Дискові операції виконуються у thread-пулі (asyncio.to_thread): повільний диск
+# не зупиняє обробку апдейтів інших користувачів.
+
+async def asave_bytes(data: bytes, **kwargs) -> StoredFile:
+    """Async-варіант save_bytes (ті самі keyword-аргументи)."""
+    return await asyncio.to_thread(lambda: save_bytes(data, **kwargs))
+
+
+async def aread_bytes(rel_path: str | Path) -> bytes:
+    """Async-варіант read_bytes."""
+    return await asyncio.to_thread(read_bytes, rel_path)
+
+
+async def adelete_file(rel_path: str | Path) -> bool:
+    """Async-варіант delete_file."""
+    return await asyncio.to_thread(delete_file, rel_path)
+
+
+async def acleanup_old(category: Optional[str] = None, retention_days: int = MEDIA_RETENTION_DAYS) -> int:
+    """Async-варіант cleanup_old: обхід rglob за місяці медіа може тривати секунди."""
+    return await asyncio.to_thread(cleanup_old, category, retention_days)